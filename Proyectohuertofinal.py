@@ -1,46 +1,185 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-import joblib
-from datetime import datetime
-from sklearn.metrics import accuracy_score, precision_score, f1_score
-import requests
-from collections import defaultdict
-from dateutil import parser
-
-# Cargar el modelo y los datos
-modelo = joblib.load('mejor_modelo_dia_noche.pkl')
-df = joblib.load('datos_huerto.pkl')
-
-from io import BytesIO
-def save_fig_to_bytesio(fig):
-    buffer = BytesIO()
-    fig.savefig(buffer, format='png')
-    buffer.seek(0)
-    return buffer
-
-def modificar_eje_x(fig, ax, fechas):
-    if len(fechas.dt.date.unique()) == 1:
-        # Mostrar todas las horas sin los minutos
-        ax.xaxis.set_major_locator(mdates.HourLocator())
-        ax.xaxis.set_major_formatter(mdates.DateFormatter('%H'))
-    else:
-        ax.xaxis.set_major_locator(mdates.DayLocator())
-        ax.xaxis.set_major_formatter(mdates.DateFormatter('%d-%m-%Y'))
-    fig.autofmt_xdate()
+import os
+from datetime import datetime, timedelta
+import almacen
+import evaluacion
+import matrices
+import predicciones
+import registro_modelos
+from consultas import filas_dias
+from graficas import (clave_grafica, grafica_comparacion, grafica_dia, grafica_dispositivos,
+                      grafica_evaluacion, grafica_interactiva, grafica_mapa_calor, grafica_union, png_en_cache, serie_reducida)
+import diagnostico
+import ingesta
+from datos import RUTA_DATOS
+from mediciones import COLUMNAS
+
+RUTA_MODELO = 'mejor_modelo_dia_noche.pkl'
+INTERVALO_COMPROBACION = 30
+
+# Versión del modelo y de los datos.
+# Streamlit vuelve a ejecutar el script con cada interacción, así que los datos se guardan
+# en caché, compartida entre todas las sesiones, y se vuelven a leer cuando cambia la
+# versión del almacén, que se publica cada vez que se guardan datos nuevos. La aplicación
+# no carga el modelo: las predicciones ya están guardadas en el almacén y solo hace falta
+# saber qué versión del modelo está vigente, la del registro de modelos o, si todavía no
+# hay registro, la huella de mejor_modelo_dia_noche.pkl (se recalcula cuando cambia su
+# fecha de modificación).
+def modelo_vigente():
+    version = registro_modelos.version_actual()
+    return version, None if version else os.path.getmtime(RUTA_MODELO)
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def version_del_modelo(version, fecha_modificacion):
+    if version is None:
+        return predicciones.version_modelo(RUTA_MODELO)
+    return version
+
+@st.cache_resource(show_spinner=False)
+def preparar_almacen():
+    # Los datos se leen del almacén por meses; la primera vez se migra la copia en pickle
+    # y, si el almacén es anterior a los resúmenes diarios y mensuales, se crean
+    almacen.migrar_pickle(RUTA_DATOS)
+    almacen.preparar_resumenes()
+
+# Solo se ejecuta cuando cambia la versión del modelo o de los datos: vacía las cachés de
+# datos de la versión anterior y, si hay filas sin puntuar con el modelo vigente (o todas,
+# si el modelo ha cambiado), lanza la puntuación en segundo plano. Mientras tanto la
+# página muestra las predicciones que ya hay guardadas.
+@st.cache_resource(max_entries=1, show_spinner=False)
+def asegurar_predicciones(version_modelo, version):
+    limpiar_cache_datos()
+    if predicciones.pendientes(version_modelo):
+        ingesta.lanzar_puntuacion()
+    return version
+
+# Los selectores, el resumen del día y la tabla mensual leen los resúmenes ya calculados
+# del almacén (uno por día y uno por mes), no las filas horarias
+@st.cache_data(max_entries=8, show_spinner=False)
+def resumen_mensual(version):
+    return almacen.resumen_mensual()
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def resumen_diario(version):
+    diario = almacen.resumen_diario()
+    return None if diario is None else diario.set_index("Fecha")
+
+def meses_guardados(version):
+    mensual = resumen_mensual(version)
+    if mensual is None:
+        return []
+    return list(zip(mensual["Mes"].dt.year, mensual["Mes"].dt.month))
+
+def resumen_dia(fecha, version):
+    diario = resumen_diario(version)
+    fecha = pd.Timestamp(fecha)
+    if diario is None or fecha not in diario.index:
+        return None
+    return diario.loc[fecha]
+
+# Tabla de resumen por mes para mostrar
+def tabla_mensual(mensual):
+    tabla = pd.DataFrame({"Mes": mensual["Mes"].dt.strftime('%m-%Y')})
+    for columna, nombre in zip(COLUMNAS, ["Temp.", "Hum.", "Cond."]):
+        tabla[f"{nombre} media"] = mensual[f"{columna}_media"].round(2)
+        tabla[f"{nombre} mín."] = mensual[f"{columna}_min"].round(2)
+        tabla[f"{nombre} máx."] = mensual[f"{columna}_max"].round(2)
+    tabla["Horas"] = mensual["Temperatura_horas"]
+    tabla["Horas de día"] = mensual["horas_dia"]
+    tabla["Horas de noche"] = mensual["horas_noche"]
+    tabla["Acierto (%)"] = (100 * mensual["aciertos"] / mensual["predichas"].where(mensual["predichas"] > 0)).round(1)
+    return tabla
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def cargar_mes(año, mes, version):
+    return almacen.cargar([(año, mes)])
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def cargar_dia(fecha, version):
+    return almacen.cargar(desde=fecha, hasta=fecha + timedelta(days=1))
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def cargar_dia_dispositivos(fecha, version):
+    return almacen.cargar_dispositivos(desde=fecha, hasta=fecha + timedelta(days=1))
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def rango_fechas(version):
+    return almacen.primera_fecha(), almacen.ultima_fecha()
+
+# Serie reducida (min/max por cubeta) de un periodo cualquiera para la gráfica interactiva.
+# Solo se leen los meses del periodo y el tamaño del resultado no depende de su longitud.
+@st.cache_data(max_entries=32, show_spinner=False)
+def serie_periodo(desde, hasta, version):
+    return serie_reducida(almacen.cargar(columnas=COLUMNAS, desde=desde, hasta=hasta))
+
+# Matrices día × hora de cada medición para la comparación de días y los mapas de calor.
+# Se construyen una vez por versión de los datos y se comparten sin copiarlas.
+@st.cache_resource(max_entries=1, show_spinner=False)
+def matrices_horarias(version):
+    return matrices.matrices_dia_hora(almacen.cargar(columnas=COLUMNAS), COLUMNAS)
+
+# Evaluación del modelo en todo el histórico: una sola pasada por Estado y Predicciones
+# para sacar las métricas de cada día, de cada mes y del total
+@st.cache_data(max_entries=4, show_spinner=False)
+def evaluacion_modelo(version, version_modelo):
+    return evaluacion.evaluar(almacen.cargar(columnas=["Estado", "Predicciones"]))
+
+# Tabla de evaluación para mostrar, por día o por mes
+def tabla_evaluacion(tabla, formato):
+    tabla = tabla.reset_index()
+    tabla[tabla.columns[0]] = tabla[tabla.columns[0]].dt.strftime(formato)
+    tabla = tabla.rename(columns={"vp": "VP", "fp": "FP", "fn": "FN", "vn": "VN", "horas": "Horas",
+                                  "accuracy": "Accuracy", "precision": "Precisión", "recall": "Exhaustividad",
+                                  "f1": "F1"})
+    return tabla.round(3)
+
+def limpiar_cache_datos():
+    resumen_mensual.clear()
+    resumen_diario.clear()
+    evaluacion_modelo.clear()
+    cargar_mes.clear()
+    cargar_dia.clear()
+    cargar_dia_dispositivos.clear()
+    rango_fechas.clear()
+    serie_periodo.clear()
+
+huella_modelo = modelo_vigente()
+version_modelo = version_del_modelo(*huella_modelo)
+preparar_almacen()
+version_datos = asegurar_predicciones(version_modelo, almacen.version())
+
+# Cada INTERVALO_COMPROBACION segundos se mira si la ingesta en segundo plano (o ingesta.py,
+# o modelo.py) ha publicado datos nuevos o un modelo nuevo y, si es así, se vuelve a
+# ejecutar la página entera con ellos
+@st.experimental_fragment(run_every=INTERVALO_COMPROBACION)
+def comprobar_versiones():
+    if almacen.version() != version_datos or modelo_vigente() != huella_modelo:
+        st.rerun()
+
+# Resumen por etapa de los registros de diagnóstico: llamadas, tiempos, filas y bytes
+def tabla_diagnostico(registros):
+    df = pd.DataFrame(registros)
+    for columna in ["filas", "bytes"]:
+        if columna not in df:
+            df[columna] = float("nan")
+    tabla = df.groupby("etapa").agg(llamadas=("segundos", "size"), total_s=("segundos", "sum"),
+                                    media_ms=("segundos", "mean"), max_ms=("segundos", "max"),
+                                    filas=("filas", "sum"), bytes=("bytes", "sum"))
+    tabla["media_ms"] *= 1000
+    tabla["max_ms"] *= 1000
+    return tabla.sort_values("total_s", ascending=False).round(3)
 
 # Función para configurar el botón de descarga
-def configurar_boton_descarga(fig, fechas):
+def configurar_boton_descarga(png, fechas):
     if len(fechas.dt.date.unique()) == 1:
         nombre_archivo = fechas.dt.date.unique()[0].strftime('%Y-%m-%d') + '.png'
     else:
         nombre_archivo = fechas.dt.to_period('M').unique()[0].strftime('%Y-%m') + '.png'
 
-    fig_buffer = save_fig_to_bytesio(fig)
     st.download_button(
         label="Descargar gráficas",
-        data=fig_buffer,
+        data=png,
         file_name=nombre_archivo,
         mime="image/png"
     )
@@ -58,143 +197,6 @@ def configurar_boton_imprimir(fig, fechas):
         fig.savefig(nombre_archivo)
         st.success(f'Gráfica guardada como {nombre_archivo}')
 
-def obtenerDatos():
-    try:
-        fechaInicio = datetime(2024, 3, 8)
-        fechaActual = datetime.now()
-        timestampInicio = int(fechaInicio.timestamp()) * 1000
-        timestampActual = int(fechaActual.timestamp()) * 1000
-        url = "https://sensecap.seeed.cc/openapi/list_telemetry_data"
-
-        dispositivos = ['2CF7F1C0523000A2', '2CF7F1C05230009C', '2CF7F1C05230001D', '2CF7F1C043500730']
-
-        datos_temperatura = defaultdict(list)
-        datos_humedad = defaultdict(list)
-        datos_conductibilidad = defaultdict(list)
-
-        for device_eui in dispositivos:
-            params = {
-                'device_eui':  device_eui,
-                'channel_index': 1,
-                "time_start": str(timestampInicio),
-                "time_end": str(timestampActual)
-            }
-            respuesta = requests.get(url, params=params, auth=('93I2S5UCP1ISEF4F', '6552EBDADED14014B18359DB4C3B6D4B3984D0781C2545B6A33727A4BBA1E46E'))
-
-            if respuesta.status_code == 200:
-                datos = respuesta.json()
-                tipoMedicion = list()
-                bloque0 = list()
-                bloque1 = list()
-                bloque2 = list()
-                indice = 0  
-
-                for i, lista in enumerate(datos["data"]["list"]):
-                    for medicion in lista:
-                        if(i == 0):
-                            tipoMedicion.append(medicion[1])
-                        else:
-                            if indice == 0:
-                                bloque0.append(medicion)
-                            elif indice == 1:
-                                bloque1.append(medicion)
-                            else:
-                                bloque2.append(medicion)
-                            indice = indice + 1
-
-                posicion4102 = next((i for i, x in enumerate(tipoMedicion) if x == "4102"), None)
-                posicion4103 = next((i for i, x in enumerate(tipoMedicion) if x == "4103"), None)
-                posicion4108 = next((i for i, x in enumerate(tipoMedicion) if x == "4108"), None)
-
-                medicionTemperatura = bloque0[0] if posicion4102 == 0 else (
-                    bloque1[0] if posicion4102 == 1 else bloque2[0])
-
-                medicionHumedad = bloque0[0] if posicion4103 == 0 else (
-                    bloque1[0] if posicion4103 == 1 else bloque2[0])
-
-                medicionC02 = bloque0[0] if posicion4108 == 0 else (
-                    bloque1[0] if posicion4108 == 1 else bloque2[0])
-                
-                for med_temp in medicionTemperatura:
-                    fecha = parser.parse(med_temp[1]).strftime('%Y-%m-%d %H:%M:%S')
-                    datos_temperatura[fecha]= med_temp[0]
-
-                for med_temp in medicionHumedad:
-                    fecha = parser.parse(med_temp[1]).strftime('%Y-%m-%d %H:%M:%S')
-                    datos_humedad[fecha]= med_temp[0]
-
-                for med_temp in medicionC02:
-                    fecha = parser.parse(med_temp[1]).strftime('%Y-%m-%d %H:%M:%S')
-                    datos_conductibilidad[fecha]= med_temp[0]
-
-        df_temperatura = pd.DataFrame(list(datos_temperatura.items()), columns=["Fecha", "Temperatura"])
-        df_humedad = pd.DataFrame(list(datos_humedad.items()), columns=["Fecha", "Humedad"])
-        df_conductibilidad = pd.DataFrame(list(datos_conductibilidad.items()), columns=["Fecha", "Conductibilidad"])
-
-        return df_temperatura, df_humedad, df_conductibilidad
-
-    except Exception as e:
-        st.error(f"Error al obtener datos: {e}")
-        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
-
-# Función para crear el DataFrame combinado
-def crear_dataframe(df_temperatura, df_humedad, df_conductibilidad):
-    df = pd.merge(df_temperatura, df_humedad, on="Fecha", how="outer")
-    df = pd.merge(df, df_conductibilidad, on="Fecha", how="outer")
-    df["Fecha"] = pd.to_datetime(df["Fecha"])
-    df = df.set_index("Fecha").resample("H").mean().reset_index()
-    return df
-
-# Función para determinar si es de día o de noche
-def obtener_estado(fecha):
-    try:
-        horas_sol = {
-           "Enero": [("08:55", "17:57"), ("08:55", "17:58"), ("08:55", "17:59"), ("08:55", "18:00"), ("08:55", "18:01"), ("08:55", "18:02"), ("08:55", "18:03"), ("08:55", "18:04"), ("08:55", "18:05"), ("08:54", "18:06"), ("08:54", "18:07"), ("08:54", "18:08"), ("08:53", "18:09"), ("08:53", "18:11"), ("08:52", "18:12"), ("08:52", "18:13"), ("08:51", "18:14"), ("08:51", "18:15"), ("08:50", "18:17"), ("08:50", "18:18"), ("08:49", "18:19"), ("08:48", "18:20"), ("08:47", "18:22"), ("08:47", "18:23"), ("08:46", "18:24"), ("08:45", "18:26"), ("08:44", "18:27"), ("08:43", "18:28"), ("08:42", "18:30"), ("08:41", "18:31"), ("08:40", "18:32")],
-           "Febrero": [("08:39", "18:34"), ("08:38", "18:35"), ("08:37", "18:36"), ("08:36", "18:38"), ("08:35", "18:39"), ("08:33", "18:40"), ("08:32", "18:42"), ("08:31", "18:43"), ("08:30", "18:45"), ("08:28", "18:46"), ("08:27", "18:47"), ("08:26", "18:49"), ("08:24", "18:50"), ("08:23", "18:51"), ("08:21", "18:53"), ("08:20", "18:54"), ("08:19", "18:55"), ("08:17", "18:57"), ("08:16", "18:58"), ("08:14", "18:59"), ("08:13", "19:01"), ("08:11", "19:02"), ("08:09", "19:03"), ("08:08", "19:04"), ("08:06", "19:06"), ("08:05", "19:07"), ("08:03", "19:08"), ("08:01", "19:10"), ("08:00", "19:11")],
-           "Marzo": [("07:58", "19:12"), ("07:56", "19:13"), ("07:55", "19:15"), ("07:53", "19:16"), ("07:51", "19:17"), ("07:50", "19:18"), ("07:48", "19:20"), ("07:46", "19:21"), ("07:44", "19:22"), ("07:43", "19:23"), ("07:41", "19:25"), ("07:39", "19:26"), ("07:37", "19:27"), ("07:36", "18:28"), ("07:34", "19:29"), ("07:32", "19:31"), ("07:30", "19:32"), ("07:28", "19:33"), ("07:27", "19:34"), ("07:25", "19:35"), ("07:23", "19:37"), ("07:21", "19:38"), ("07:20", "19:39"), ("07:18", "19:40"), ("07:16", "19:41"), ("07:14", "19:43"), ("07:12", "19:44"), ("07:11", "19:45"), ("07:09", "19:46"), ("07:07", "19:47"), ("08:05", "20:49")],
-           "Abril": [("08:03", "20:50"), ("08:02", "20:51"), ("08:00", "20:52"), ("07:58", "20:53"), ("07:56", "20:54"), ("07:55", "20:56"), ("07:53", "20:57"), ("07:51", "20:58"), ("07:50", "20:59"), ("07:48", "21:00"), ("07:46", "21:01"), ("07:44", "21:03"), ("07:43", "21:04"), ("07:41", "21:05"), ("07:39", "21:06"), ("07:38", "21:07"), ("07:36", "21:09"), ("07:35", "21:10"), ("07:33", "21:11"), ("07:31", "21:12"), ("07:30", "21:13"), ("07:28", "21:14"), ("07:27", "21:16"), ("07:25", "21:17"), ("07:24", "21:18"), ("07:22", "21:19"), ("07:21", "21:20"), ("07:19", "21:21"), ("07:18", "21:23"), ("07:16", "21:24")],
-           "Mayo": [("07:15", "21:25"), ("07:14", "21:26"), ("07:12", "21:27"), ("07:11", "21:28"), ("07:10", "21:30"), ("07:08", "21:31"), ("07:07", "21:32"), ("07:06", "21:33"), ("07:05", "21:34"), ("07:03", "21:35"), ("07:02", "21:36"), ("07:01", "21:37"), ("07:00", "21:38"), ("06:59", "21:40"), ("06:58", "21:41"), ("06:57", "21:42"), ("06:56", "21:43"), ("06:55", "21:44"), ("06:54", "21:45"), ("06:53", "21:46"), ("06:52", "21:47"), ("06:51", "21:48"), ("06:51", "21:49"), ("06:50", "21:50"), ("06:49", "21:51"), ("06:48", "21:52"), ("06:48", "21:53"), ("06:47", "21:53"), ("06:46", "21:54"), ("06:46", "21:55"), ("06:45", "21:56")],
-           "Junio": [("06:45", "21:57"), ("06:44", "21:58"), ("06:44", "21:58"), ("06:44", "21:59"), ("06:43", "22:00"), ("06:43", "22:00"), ("06:43", "22:01"), ("06:42", "22:02"), ("06:42", "22:02"), ("06:42", "22:03"), ("06:42", "22:03"), ("06:42", "22:04"), ("06:42", "22:04"), ("06:42", "22:05"), ("06:42", "22:05"), ("06:42", "22:06"), ("06:42", "22:06"), ("06:42", "22:06"), ("06:42", "22:07"), ("06:42", "22:07"), ("06:43", "22:07"), ("06:43", "22:07"), ("06:43", "22:07"), ("06:43", "22:07"), ("06:44", "22:08"), ("06:44", "22:08"), ("06:45", "22:08"), ("06:45", "22:08"), ("06:46", "22:07"), ("06:46", "22:07")],
-           "Julio": [("06:47", "22:07"), ("06:47", "22:07"), ("06:48", "22:07"), ("06:48", "22:07"), ("06:49", "22:06"), ("06:50", "22:06"), ("06:50", "22:05"), ("06:51", "22:05"), ("06:52", "22:05"), ("06:53", "22:04"), ("06:53", "22:04"), ("06:54", "22:03"), ("06:55", "22:02"), ("06:56", "22:02"), ("06:57", "22:01"), ("06:58", "22:00"), ("06:58", "22:00"), ("06:59", "21:59"), ("07:00", "21:58"), ("07:01", "21:57"), ("07:02", "21:56"), ("07:03", "21:56"), ("07:04", "21:55"), ("07:05", "21:54"), ("07:06", "21:53"), ("07:07", "21:52"), ("07:08", "21:51"), ("07:09", "21:50"), ("07:10", "21:48"), ("07:11", "21:47"), ("07:12", "21:46")],
-           "Agosto": [("07:13", "21:45"), ("07:14", "21:44"), ("07:16", "21:43"), ("07:17", "21:41"), ("07:18", "21:40"), ("07:19", "21:39"), ("07:20", "21:37"), ("07:21", "21:36"), ("07:22", "21:35"), ("07:23", "21:33"), ("07:24", "21:32"), ("07:25", "21:30"), ("07:27", "21:29"), ("07:28", "21:27"), ("07:29", "21:26"), ("07:30", "21:24"), ("07:31", "21:23"), ("07:32", "21:21"), ("07:33", "21:20"), ("07:34", "21:18"), ("07:35", "21:16"), ("07:36", "21:15"), ("07:38", "21:13"), ("07:39", "21:12"), ("07:40", "21:10"), ("07:41", "21:08"), ("07:42", "21:07"), ("07:43", "21:05"), ("07:44", "21:03"), ("07:45", "21:01"), ("07:46", "21:00")],
-           "Septiembre": [("07:48", "20:58"), ("07:49", "20:56"), ("07:50", "20:54"), ("07:51", "20:53"), ("07:52", "20:51"), ("07:53", "20:49"), ("07:54", "20:47"), ("07:55", "20:46"), ("07:56", "20:44"), ("07:57", "20:42"), ("07:59", "20:40"), ("08:00", "20:38"), ("08:01", "20:36"), ("08:02", "20:35"), ("08:03", "20:33"), ("08:04", "20:31"), ("08:05", "20:29"), ("08:06", "20:27"), ("08:07", "20:26"), ("08:09", "20:24"), ("08:10", "20:22"), ("08:11", "20:20"), ("08:12", "20:18"), ("08:13", "20:16"), ("08:14", "20:15"), ("08:15", "20:13"), ("08:16", "20:11"), ("08:17", "20:09"), ("08:19", "20:07"), ("08:20", "20:66")],
-           "Octubre": [("08:21", "20:04"), ("08:22", "20:02"), ("08:23", "20:00"), ("08:24", "19:58"), ("08:26", "19:57"), ("08:27", "19:55"), ("08:28", "19:53"), ("08:29", "19:51"), ("08:30", "19:50"), ("08:31", "19:48"), ("08:33", "19:46"), ("08:34", "19:45"), ("08:35", "19:43"), ("08:36", "19:41"), ("08:37", "19:40"), ("08:39", "19:38"), ("08:40", "19:36"), ("08:41", "19:35"), ("08:42", "19:33"), ("08:44", "19:32"), ("08:45", "19:30"), ("08:46", "19:28"), ("08:47", "19:27"), ("08:49", "19:25"), ("08:50", "19:24"), ("08:51", "19:23"), ("07:52", "18:21"), ("07:54", "18:20"), ("07:55", "18:18"), ("07:56", "18:17"), ("07:57", "18:15")],
-           "Noviembre": [("07:59", "18:14"), ("08:00", "18:13"), ("08:01", "18:12"), ("08:03", "18:10"), ("08:04", "18:09"), ("08:05", "18:08"), ("08:07", "18:07"), ("08:08", "18:06"), ("08:09", "18:04"), ("08:10", "18:03"), ("08:12", "18:02"), ("08:13", "18:01"), ("08:14", "18:00"), ("08:16", "17:59"), ("08:17", "17:58"), ("08:18", "17:57"), ("08:19", "17:57"), ("08:21", "17:56"), ("08:22", "17:55"), ("08:23", "17:54"), ("08:24", "17:53"), ("08:26", "17:53"), ("08:27", "17:52"), ("08:28", "17:51"), ("08:29", "17:51"), ("08:30", "17:50"), ("08:32", "17:50"), ("08:33", "17:49"),("08:34", "17:49"), ("08:35", "17:49") ],
-           "Diciembre": [("08:36", "17:48"), ("08:37", "17:48"), ("08:38", "17:48"), ("08:39", "17:47"), ("08:40", "17:47"), ("08:41", "17:47"), ("08:42", "17:47"), ("08:43", "17:47"), ("08:44", "17:47"), ("08:45", "17:47"), ("08:46", "17:47"),("08:46", "17:47"), ("08:47", "17:47"), ("08:48", "17:48"), ("08:49", "17:48"), ("08:49", "17:48"), ("08:50", "17:48"), ("08:51", "17:49"), ("08:51", "17:49"), ("08:52", "17:50"), ("08:52", "17:50"), ("08:53", "17:51"), ("08:53", "17:51"), ("08:54", "17:52"), ("08:54", "17:52"), ("08:54", "17:53"), ("08:55", "17:54"), ("08:55", "17:55"), ("08:55", "17:55"), ("08:55", "17:56"), ("08:55", "17:57")]
-           }
-
-        meses_espanol = {
-            'January': 'Enero', 'February': 'Febrero', 'March': 'Marzo', 'April': 'Abril',
-            'May': 'Mayo', 'June': 'Junio', 'July': 'Julio', 'August': 'Agosto',
-            'September': 'Septiembre', 'October': 'Octubre', 'November': 'Noviembre', 'December': 'Diciembre'
-        }
-
-        fecha_dt = pd.to_datetime(fecha)
-        mes_nombre = fecha_dt.strftime('%B')
-        dia = fecha_dt.day
-        
-        mes_nombre_espanol = meses_espanol[mes_nombre]
-        
-        hora = fecha_dt.strftime('%H:%M')
-
-        hora_salida, hora_puesta = horas_sol[mes_nombre_espanol][dia - 1]
-
-        estado = 1 if hora_salida <= hora <= hora_puesta else 0
-        return estado
-    except Exception as e:
-        return f"Error al determinar el estado: {e}"
-
-# Función para cargar el modelo y los datos
-def cargar_datos():
-    df_temperatura, df_humedad, df_conductibilidad = obtenerDatos()
-    df = crear_dataframe(df_temperatura, df_humedad, df_conductibilidad)
-    df['Fecha'] = pd.to_datetime(df['Fecha'])
-    df['Estado'] = df['Fecha'].apply(lambda x: obtener_estado(x.strftime('%Y-%m-%d %H:%M:%S')))
-    df = df.dropna()
-    return df
-
-
-
 # Configuración de la página
 st.set_page_config(layout="wide", page_title="Huerto Inteligente 4.0", page_icon="💻")
 
@@ -246,7 +248,7 @@ with st.expander(":blue[:rainbow-background[Normas de Uso del Programa]]"):
     <div style='background-color: #C9E3F2; padding: 10px; border-radius: 5px;'>
         <p><strong>Actualización de Datos:</strong></p>
         <ul>
-            <li>El botón de 'Actualizar' carga los datos desde la última actualización hasta el momento actual. Este proceso tarda aproximadamente un minuto. Es recomendable usar esta función para obtener los datos más recientes.</li>
+            <li>El botón de 'Actualizar' carga los datos desde la última actualización hasta el momento actual. Solo se descargan las mediciones nuevas y la descarga se hace en segundo plano, así que se puede seguir usando la página mientras tanto. Los datos nuevos aparecen en cuanto termina. Si varias personas lo pulsan a la vez se hace una sola actualización para todas. Las semanas ya cerradas se guardan en una caché local y no se vuelven a pedir a la API.</li>
         </ul>
         <p><strong>Selección de Año y Mes:</strong></p>
         <ul>
@@ -255,10 +257,24 @@ with st.expander(":blue[:rainbow-background[Normas de Uso del Programa]]"):
         <p><strong>Gráficas Diarias:</strong></p>
         <ul>
             <li>En la columna derecha, selecciona una fecha específica. Para esa fecha, se generarán tres tipos de gráficas: temperatura del suelo, humedad del suelo y conductibilidad.</li>
+            <li>Con la casilla 'Ver cada dispositivo por separado' se muestran las mismas mediciones de cada sensor, sin promediar.</li>
+        </ul>
+        <p><strong>Resumen Mensual:</strong></p>
+        <ul>
+            <li>La tabla muestra, para cada mes guardado, la media, el mínimo y el máximo de cada medición, las horas de día y de noche y el porcentaje de horas en las que la predicción del modelo coincide con el estado real.</li>
+        </ul>
+        <p><strong>Evaluación del Modelo:</strong></p>
+        <ul>
+            <li>Muestra la exactitud, la precisión, la exhaustividad y el F1 del modelo en todo el histórico y, según la opción elegida, para cada día o cada mes, con una gráfica de su evolución. La tabla se puede ordenar pulsando en las columnas para encontrar los días en los que el modelo falla más.</li>
         </ul>
         <p><strong>Generación de Gráficas Mensuales:</strong></p>
         <ul>
             <li>Para crear gráficas mensuales, primero selecciona un año y un mes. Se cargarán todos los días disponibles para esa selección. Luego, elige los días específicos para los cuales deseas generar las gráficas y pulsa el botón 'Generar Gráficas'.</li>
+            <li>El botón 'Mapa de calor' muestra todos los días del mes elegido, o de toda su estación (invierno de diciembre a febrero, primavera de marzo a mayo, verano de junio a agosto y otoño de septiembre a noviembre), en una imagen por medición: un día por fila, una hora por columna y el valor en color.</li>
+        </ul>
+        <p><strong>Gráfica Interactiva:</strong></p>
+        <ul>
+            <li>Selecciona cualquier periodo, hasta todo el histórico. La gráfica muestra una versión reducida de los datos; al acortar el periodo se cargan con más detalle. También se puede hacer zoom con la rueda del ratón.</li>
         </ul>
     </div>
              <br>
@@ -292,26 +308,39 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
+# La actualización se hace en segundo plano (o con el proceso independiente ingesta.py):
+# la página solo lee datos ya guardados y se actualiza sola cuando cambia su versión
+# (comprobar_versiones).
+# Los datos se guardan en el almacén, que hace de "copia de seguridad" actualizada, así que
+# si el servidor se reiniciase se cargaría esta copia y solo se descargarían los datos nuevos.
 if st.button("Actualizar datos"):
-    df = cargar_datos()
-    # Esto además guarda la última obtención de datos para tener siempre una "copia de seguridad" actualizada.
-    # En caso de que el servidor se reiniciase, se cargaría esta copia y solo se actualizarían los datos
-    # ...en caso de que se pulse el botón. Esto permite consultar datos viejos desde la última actualización.
-    joblib.dump(df, 'datos_huerto.pkl')
-    
+    if ingesta.lanzar_en_segundo_plano():
+        st.info("Actualización iniciada. Los datos nuevos aparecerán en cuanto termine.")
+    else:
+        st.info("Ya hay una actualización en curso.")
+
+estado_ingesta = ingesta.estado()
+if estado_ingesta["en_curso"]:
+    st.info("Actualizando datos en segundo plano...")
+elif estado_ingesta["ultimo_error"]:
+    st.error(f"Error al obtener datos: {estado_ingesta['ultimo_error']}")
+elif estado_ingesta["ultima_ejecucion"] is not None:
+    st.caption(f"Última actualización: {estado_ingesta['ultima_ejecucion']:%d-%m-%Y %H:%M}, "
+               f"{estado_ingesta['filas_nuevas']} horas nuevas.")
+comprobar_versiones()
 
 # Selectores y tabla de datos
 col1, col2 = st.columns(2)
 
 with col1:
     st.markdown('<div class="subheader">Datos de Predicción</div>', unsafe_allow_html=True)
-    años_disponibles1 = df['Fecha'].dt.year.unique()
+    años_disponibles1 = sorted({año for año, _ in meses_guardados(version_datos)})
     año_seleccionado1 = st.selectbox("Selecciona un año (Tabla)", años_disponibles1, key="year_table")
 
-    meses_disponibles1 = df[df['Fecha'].dt.year == año_seleccionado1]['Fecha'].dt.month.unique()
+    meses_disponibles1 = [mes for año, mes in meses_guardados(version_datos) if año == año_seleccionado1]
     mes_seleccionado1 = st.selectbox("Selecciona un mes (Tabla)", meses_disponibles1, key="month_table")
 
-    df_filtrado = df[(df['Fecha'].dt.year == año_seleccionado1) & (df['Fecha'].dt.month == mes_seleccionado1)]
+    df_filtrado = cargar_mes(año_seleccionado1, mes_seleccionado1, version_datos)
 
     st.markdown('<div class="dataframe-container">', unsafe_allow_html=True)
     st.dataframe(df_filtrado)
@@ -327,17 +356,14 @@ with col2:
 
     # Resumen del día seleccionado
     fecha_seleccionada_str = fecha_seleccionada.strftime('%Y-%m-%d')
-    df_seleccionado = df[df["Fecha"].dt.strftime('%Y-%m-%d') == fecha_seleccionada_str]
-
-    if not df_seleccionado.empty:
-        y_verdadero = df_seleccionado["Estado"]
-        X_seleccionado = df_seleccionado.drop(columns=["Fecha", "Estado"])
-        predicciones = modelo.predict(X_seleccionado)
-        df_seleccionado["Predicciones"] = predicciones
+    df_seleccionado = cargar_dia(fecha_seleccionada, version_datos)
 
-        accuracy = accuracy_score(y_verdadero, predicciones)
-        precision = precision_score(y_verdadero, predicciones, average='binary')
-        puntuacion = f1_score(y_verdadero, predicciones)
+    evaluacion_dias = evaluacion_modelo(version_datos, version_modelo)["dia"]
+    if pd.Timestamp(fecha_seleccionada) in evaluacion_dias.index:
+        metricas_dia = evaluacion_dias.loc[pd.Timestamp(fecha_seleccionada)]
+        accuracy = metricas_dia["accuracy"]
+        precision = metricas_dia["precision"]
+        puntuacion = metricas_dia["f1"]
 
         st.markdown(f'<div class="metric">Precisión (Accuracy): {accuracy:.2f}</div>', unsafe_allow_html=True)
         st.markdown(f'<div class="metric">Precisión: {precision:.2f}</div>', unsafe_allow_html=True)
@@ -350,10 +376,11 @@ with col2:
     st.markdown('<div class="summary-container">', unsafe_allow_html=True)
     st.markdown('<div class="subheader">Resumen del Día Seleccionado</div>', unsafe_allow_html=True)
 
-    if not df_seleccionado.empty:
-        temp_media = df_seleccionado['Temperatura'].mean()
-        humedad_media = df_seleccionado['Humedad'].mean()
-        conductividad_media = df_seleccionado['Conductibilidad'].mean()
+    resumen_seleccionado = resumen_dia(fecha_seleccionada, version_datos)
+    if resumen_seleccionado is not None:
+        temp_media = resumen_seleccionado['Temperatura_media']
+        humedad_media = resumen_seleccionado['Humedad_media']
+        conductividad_media = resumen_seleccionado['Conductibilidad_media']
 
         st.markdown(f'<div class="metric">Temperatura Media del Suelo: {temp_media:.2f} °C</div>', unsafe_allow_html=True)
         st.markdown(f'<div class="metric">Humedad Media del Suelo: {humedad_media:.2f} %</div>', unsafe_allow_html=True)
@@ -367,51 +394,58 @@ with col2:
 if not df_seleccionado.empty:
     st.markdown('<div class="subheader">Gráficas de las Mediciones de un Día</div>', unsafe_allow_html=True)
     
-    fig, axes = plt.subplots(1, 3, figsize=(20, 5), sharex=True)
-    
-    columnas = ["Temperatura", "Humedad", "Conductibilidad"]
-    colores_grafica = ['red', 'blue', 'green']
-    titulos = ["Temperatura del Suelo", "Humedad del Suelo", "Conductibilidad"]
-    
-    for i, ax in enumerate(axes):
-        ax.plot(df_seleccionado["Fecha"], df_seleccionado[columnas[i]], label=columnas[i], color=colores_grafica[i])
-        
-        for j in range(len(df_seleccionado) - 1):
-            color = 'orange' if df_seleccionado["Predicciones"].iloc[j] == 0 else 'lightblue'
-            ax.axvspan(df_seleccionado["Fecha"].iloc[j], df_seleccionado["Fecha"].iloc[j+1], color=color, alpha=0.3)
-        
-        ax.set_ylabel(columnas[i])
-        ax.legend()
-        ax.set_title(f"{titulos[i]} del {fecha_seleccionada_str}")
-    
-    modificar_eje_x(fig, axes[-1], df_seleccionado["Fecha"])
-    axes[-1].set_xlabel("Hora" if len(df_seleccionado["Fecha"].dt.date.unique()) == 1 else "Fecha")
-    
-    handles = [plt.Line2D([0], [0], color='orange', lw=4, label='Noche'),
-               plt.Line2D([0], [0], color='lightblue', lw=4, label='Día')]
-    fig.legend(handles=handles, loc='upper center', bbox_to_anchor=(0.5, 1.05), ncol=2)
-    
-    plt.tight_layout()
-    
-    st.pyplot(fig)
-    configurar_boton_descarga(fig, df_seleccionado["Fecha"])
+    clave = clave_grafica("dia", [fecha_seleccionada], version_datos, version_modelo)
+    png = png_en_cache(clave, lambda: grafica_dia(df_seleccionado, fecha_seleccionada_str))
+    st.image(png, use_column_width=True)
+    configurar_boton_descarga(png, df_seleccionado["Fecha"])
+
+    # Las mismas mediciones de cada dispositivo por separado
+    if st.checkbox("Ver cada dispositivo por separado"):
+        df_dispositivos = cargar_dia_dispositivos(fecha_seleccionada, version_datos)
+        if df_dispositivos.empty:
+            st.write("No hay medias por dispositivo guardadas para este día.")
+        else:
+            clave = clave_grafica("dispositivos", [fecha_seleccionada], version_datos, version_modelo)
+            st.image(png_en_cache(clave, lambda: grafica_dispositivos(df_dispositivos, fecha_seleccionada_str)),
+                     use_column_width=True)
+
+# Resumen de todos los meses guardados
+mensual = resumen_mensual(version_datos)
+if mensual is not None and not mensual.empty:
+    st.markdown('<div class="subheader">Resumen Mensual</div>', unsafe_allow_html=True)
+    st.dataframe(tabla_mensual(mensual), hide_index=True, use_container_width=True)
+
+# Evaluación del modelo por día o por mes en todo el histórico
+evaluacion_completa = evaluacion_modelo(version_datos, version_modelo)
+if evaluacion_completa["total"]["horas"] > 0:
+    st.markdown('<div class="subheader">Evaluación del Modelo</div>', unsafe_allow_html=True)
+    total = evaluacion_completa["total"]
+    st.caption(f"Todo el histórico ({int(total['horas'])} horas): accuracy {total['accuracy']:.3f}, "
+               f"precisión {total['precision']:.3f}, exhaustividad {total['recall']:.3f}, F1 {total['f1']:.3f}.")
+    agrupacion = st.radio("Agrupar por", ["Día", "Mes"], horizontal=True, key="evaluacion")
+    if agrupacion == "Día":
+        tabla = evaluacion_completa["dia"]
+        formato = '%d-%m-%Y'
+    else:
+        tabla = evaluacion_completa["mes"]
+        formato = '%m-%Y'
+    st.altair_chart(grafica_evaluacion(tabla), use_container_width=True)
+    st.dataframe(tabla_evaluacion(tabla, formato), hide_index=True, use_container_width=True)
 
 # Selectores de año y mes para gráficas
 st.markdown('<div class="subheader">Generar Gráficas Mensuales</div>', unsafe_allow_html=True)
-años_disponibles = df['Fecha'].dt.year.unique()
+años_disponibles = sorted({año for año, _ in meses_guardados(version_datos)})
 año_seleccionado = st.selectbox("Selecciona un año (Gráficas)", años_disponibles, key="year_plots")
 
-meses_disponibles = df[df['Fecha'].dt.year == año_seleccionado]['Fecha'].dt.month.unique()
+meses_disponibles = [mes for año, mes in meses_guardados(version_datos) if año == año_seleccionado]
 mes_seleccionado = st.selectbox("Selecciona un mes (Gráficas)", meses_disponibles, key="month_plots")
 
-df_filtrado = df[(df['Fecha'].dt.year == año_seleccionado) & (df['Fecha'].dt.month == mes_seleccionado)]
+df_filtrado = cargar_mes(año_seleccionado, mes_seleccionado, version_datos)
 
 show_date_selector = False
 if 'df_filtrado' in locals() and not df_filtrado.empty:
     show_date_selector = True
     fechas_seleccionadas = st.multiselect("Selecciona varios días", pd.date_range(start=df_filtrado['Fecha'].min(), end=df_filtrado['Fecha'].max(), freq='D'))
-import matplotlib.colors as mcolors
-import random
 # Dividir la página en dos columnas
 col1, col2 = st.columns([1, 6])
 
@@ -419,25 +453,15 @@ col1, col2 = st.columns([1, 6])
 # Botón para la primera gráfica
 if st.button("Gráfica unión de días"):
     if show_date_selector and len(fechas_seleccionadas) > 0:
-        fechas_seleccionadas_str = [fecha.strftime('%d-%m-%Y') for fecha in fechas_seleccionadas]
-        df_seleccionado = df_filtrado[df_filtrado["Fecha"].dt.strftime('%d-%m-%Y').isin(fechas_seleccionadas_str)]
+        df_seleccionado = filas_dias(df_filtrado, fechas_seleccionadas)
 
         if not df_seleccionado.empty:
-            df_seleccionado = df_seleccionado.sort_values(by='Fecha')
-
-            fig, axs = plt.subplots(1, 3, figsize=(15, 5))
-            for i, (columna, color, titulo) in enumerate(zip(["Temperatura", "Humedad", "Conductibilidad"], ['red', 'blue', 'green'], ["Temperatura del Suelo por Día", "Humedad del Suelo por Día", "Conductibilidad por Día"])):
-                axs[i].plot(df_seleccionado["Fecha"], df_seleccionado[columna], color=color)
-                axs[i].set_xlabel("Hora" if len(df_seleccionado["Fecha"].dt.date.unique()) == 1 else "Fecha")
-                axs[i].set_ylabel(columna)
-                axs[i].set_title(titulo)
-                modificar_eje_x(fig, axs[i], df_seleccionado["Fecha"])  # Modificar el eje X
-
-            plt.tight_layout()
-            st.pyplot(fig)
+            clave = clave_grafica("union", fechas_seleccionadas, version_datos, version_modelo)
+            png = png_en_cache(clave, lambda: grafica_union(df_seleccionado))
+            st.image(png, use_column_width=True)
 
             # Configurar el botón de descarga
-            configurar_boton_descarga(fig, df_seleccionado["Fecha"])
+            configurar_boton_descarga(png, df_seleccionado["Fecha"])
         else:
             st.write("No hay datos disponibles para las fechas seleccionadas.")
     else:
@@ -449,31 +473,15 @@ if st.button("Gráfica unión de días"):
 # Botón para la segunda gráfica
 if st.button("Gráfica comparación días"):
     if show_date_selector and len(fechas_seleccionadas) > 0:
-        fechas_seleccionadas_str = [fecha.strftime('%d-%m-%Y') for fecha in fechas_seleccionadas]
-        df_seleccionado = df_filtrado[df_filtrado["Fecha"].dt.strftime('%d-%m-%Y').isin(fechas_seleccionadas_str)]
+        df_seleccionado = filas_dias(df_filtrado, fechas_seleccionadas)
 
         if not df_seleccionado.empty:
-            df_seleccionado = df_seleccionado.sort_values(by='Fecha')
-
-            fig, axs = plt.subplots(1, 3, figsize=(18, 6))  # Una fila con tres columnas para cada medición
-
-            # Crear una lista de colores única para cada día
-            colores = random.sample(list(mcolors.CSS4_COLORS.values()), len(fechas_seleccionadas))
-
-            for i, (columna, titulo) in enumerate(zip(["Temperatura", "Humedad", "Conductibilidad"], ["Temperatura del Suelo", "Humedad del Suelo", "Conductibilidad"])):
-                for j, fecha in enumerate(fechas_seleccionadas):
-                    df_dia = df_seleccionado[df_seleccionado["Fecha"].dt.date == fecha.date()]
-                    axs[i].plot(df_dia["Fecha"].dt.hour, df_dia[columna], color=colores[j], label=fecha.strftime('%d-%m-%Y'))
-                axs[i].set_xlabel("Hora")
-                axs[i].set_ylabel(columna)
-                axs[i].set_title(titulo)
-                axs[i].legend()
-
-            plt.tight_layout()
-            st.pyplot(fig)
+            clave = clave_grafica("comparacion", fechas_seleccionadas, version_datos, version_modelo)
+            png = png_en_cache(clave, lambda: grafica_comparacion(matrices_horarias(version_datos), fechas_seleccionadas))
+            st.image(png, use_column_width=True)
 
             # Configurar el botón de descarga
-            configurar_boton_descarga(fig, df_seleccionado["Fecha"])
+            configurar_boton_descarga(png, df_seleccionado["Fecha"])
         else:
             st.write("No hay datos disponibles para las fechas seleccionadas.")
     else:
@@ -482,3 +490,40 @@ if st.button("Gráfica comparación días"):
         else:
             st.write("Por favor selecciona al menos un día.")
 
+# Mapa de calor día × hora del mes elegido o de toda su estación
+if show_date_selector:
+    periodo_mapa = st.radio("Mapa de calor de", ["Mes", "Estación"], horizontal=True, key="periodo_mapa")
+    if st.button("Mapa de calor"):
+        if periodo_mapa == "Mes":
+            desde, hasta = matrices.periodo_mes(año_seleccionado, mes_seleccionado)
+            titulo = desde.strftime('%m-%Y')
+        else:
+            nombre, desde, hasta = matrices.periodo_estacion(año_seleccionado, mes_seleccionado)
+            titulo = f"{nombre} {desde.strftime('%m-%Y')} a {(hasta - timedelta(days=1)).strftime('%m-%Y')}"
+        clave = clave_grafica("mapa_calor", [desde, hasta], version_datos, version_modelo)
+        png = png_en_cache(clave, lambda: grafica_mapa_calor(matrices_horarias(version_datos), desde, hasta, titulo))
+        st.image(png, use_column_width=True)
+        st.download_button(label="Descargar gráficas", data=png, mime="image/png",
+                           file_name=f"mapa_calor_{desde.strftime('%Y-%m')}_{periodo_mapa.lower()}.png")
+
+# Gráfica interactiva de un periodo cualquiera
+st.markdown('<div class="subheader">Gráfica Interactiva de un Periodo</div>', unsafe_allow_html=True)
+primera_fecha, ultima_fecha = rango_fechas(version_datos)
+if primera_fecha is not None and primera_fecha.date() < ultima_fecha.date():
+    periodo = st.slider("Selecciona el periodo", min_value=primera_fecha.date(), max_value=ultima_fecha.date(),
+                        value=(primera_fecha.date(), ultima_fecha.date()), format="DD-MM-YYYY")
+    df_reducido = serie_periodo(periodo[0], periodo[1] + timedelta(days=1), version_datos)
+    st.altair_chart(grafica_interactiva(df_reducido), use_container_width=True)
+else:
+    st.write("No hay datos suficientes para la gráfica interactiva.")
+
+# Diagnóstico: tiempos de cada etapa (descarga, decodificación, agregación, etiquetado,
+# predicción, lectura del almacén y gráficas) registrados en este proceso
+if diagnostico.ACTIVO:
+    with st.expander("Diagnóstico"):
+        registros = diagnostico.registros()
+        st.caption(f"Versión de datos {version_datos}, modelo {version_modelo}. "
+                   f"Últimos {len(registros)} registros de este servidor.")
+        if registros:
+            st.dataframe(tabla_diagnostico(registros), use_container_width=True)
+            st.dataframe(pd.DataFrame(registros[::-1][:100]), hide_index=True, use_container_width=True)
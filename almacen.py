@@ -0,0 +1,243 @@
+import os
+
+import joblib
+import pandas as pd
+
+import diagnostico
+import resumenes
+from cerrojos import bloquear
+from consultas import filas_rango
+
+# Almacén columnar de los datos horarios: un fichero Parquet por mes
+# (datos_huerto/2024-03.parquet, datos_huerto/2024-04.parquet, ...).
+# Las actualizaciones solo reescriben los meses afectados y las lecturas
+# cargan únicamente los meses y columnas que se necesitan.
+# En la subcarpeta "dispositivos" se guardan, también por meses, las medias horarias de
+# cada dispositivo por separado (Fecha, Dispositivo y una columna por medición).
+
+RUTA_ALMACEN = 'datos_huerto'
+FICHERO_VERSION = 'version.txt'
+FICHERO_CERROJO = '.escritura.lock'
+FICHERO_ACUMULADO = 'acumulado.pkl'
+CARPETA_DISPOSITIVOS = 'dispositivos'
+
+def ruta_dispositivos(ruta=RUTA_ALMACEN):
+    return os.path.join(ruta, CARPETA_DISPOSITIVOS)
+
+def ruta_particion(año, mes, ruta=RUTA_ALMACEN):
+    return os.path.join(ruta, f"{año:04d}-{mes:02d}.parquet")
+
+# Función para listar los meses guardados como pares (año, mes) ordenados
+def particiones(ruta=RUTA_ALMACEN):
+    if not os.path.isdir(ruta):
+        return []
+    meses = []
+    for nombre in os.listdir(ruta):
+        if nombre.endswith('.parquet'):
+            año, mes = nombre[:-len('.parquet')].split('-')
+            meses.append((int(año), int(mes)))
+    return sorted(meses)
+
+def años_disponibles(ruta=RUTA_ALMACEN):
+    return sorted({año for año, _ in particiones(ruta)})
+
+def meses_disponibles(año, ruta=RUTA_ALMACEN):
+    return [mes for a, mes in particiones(ruta) if a == año]
+
+# Cerrojo de escritura: quien escribe lo tiene en exclusiva mientras cambia los meses y
+# publica la versión nueva; quien lee varios meses a la vez lo tiene compartido, así que
+# nunca ve una mezcla de meses de dos versiones distintas.
+def escritura(ruta=RUTA_ALMACEN):
+    return bloquear(os.path.join(ruta, FICHERO_CERROJO), exclusivo=True)
+
+def lectura(ruta=RUTA_ALMACEN):
+    return bloquear(os.path.join(ruta, FICHERO_CERROJO), exclusivo=False)
+
+# Número de versión de los datos guardados. Cambia cada vez que se escribe algo,
+# así que sirve como clave barata para las cachés de quien lee el almacén.
+def version(ruta=RUTA_ALMACEN):
+    try:
+        with open(os.path.join(ruta, FICHERO_VERSION), encoding='utf-8') as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+def publicar_version(ruta=RUTA_ALMACEN):
+    nueva = version(ruta) + 1
+    destino = os.path.join(ruta, FICHERO_VERSION)
+    temporal = destino + '.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        f.write(str(nueva))
+    os.replace(temporal, destino)
+    return nueva
+
+# Escribe un mes en un fichero temporal y lo renombra, para que nunca se lea a medias
+def _escribir_parquet(df_mes, año, mes, ruta, orden):
+    os.makedirs(ruta, exist_ok=True)
+    destino = ruta_particion(año, mes, ruta)
+    temporal = destino + '.tmp'
+    df_mes = df_mes.sort_values(orden).reset_index(drop=True)
+    df_mes.to_parquet(temporal, index=False)
+    os.replace(temporal, destino)
+    return df_mes
+
+def escribir_particion(df_mes, año, mes, ruta=RUTA_ALMACEN):
+    df_mes = _escribir_parquet(df_mes, año, mes, ruta, "Fecha")
+
+    # Los resúmenes diarios y mensuales se actualizan con el mes escrito
+    if resumenes.existen(ruta):
+        resumenes.actualizar_mes(df_mes, año, mes, ruta)
+    else:
+        _reconstruir_resumenes(ruta)
+
+def leer_particion(año, mes, columnas=None, ruta=RUTA_ALMACEN):
+    if columnas is not None and "Fecha" not in columnas:
+        columnas = ["Fecha"] + list(columnas)
+    return pd.read_parquet(ruta_particion(año, mes, ruta), columns=columnas)
+
+def escribir_particion_dispositivos(df_mes, año, mes, ruta=RUTA_ALMACEN):
+    _escribir_parquet(df_mes, año, mes, ruta_dispositivos(ruta), ["Fecha", "Dispositivo"])
+
+# Función para cargar los datos de los meses indicados (por defecto, todos).
+# También se puede pedir un rango de fechas [desde, hasta) y solo se leen los meses que lo tocan.
+@diagnostico.medido("almacen.cargar")
+def cargar(meses=None, columnas=None, desde=None, hasta=None, ruta=RUTA_ALMACEN):
+    return _cargar(ruta, meses, columnas, desde, hasta, ruta)
+
+# Igual que cargar, pero con las medias de cada dispositivo
+@diagnostico.medido("almacen.cargar_dispositivos")
+def cargar_dispositivos(meses=None, columnas=None, desde=None, hasta=None, ruta=RUTA_ALMACEN):
+    if columnas is not None and "Dispositivo" not in columnas:
+        columnas = ["Dispositivo"] + list(columnas)
+    return _cargar(ruta_dispositivos(ruta), meses, columnas, desde, hasta, ruta)
+
+# `carpeta` es la de los ficheros que se leen y `ruta` la del almacén, con su cerrojo
+def _cargar(carpeta, meses, columnas, desde, hasta, ruta):
+    disponibles = particiones(carpeta)
+    if meses is not None:
+        meses = set(meses)
+        disponibles = [m for m in disponibles if m in meses]
+    if desde is not None:
+        desde = pd.Timestamp(desde)
+        disponibles = [m for m in disponibles if m >= (desde.year, desde.month)]
+    if hasta is not None:
+        hasta = pd.Timestamp(hasta)
+        disponibles = [m for m in disponibles if m <= (hasta.year, hasta.month)]
+
+    if not disponibles:
+        return pd.DataFrame(columns=["Fecha"] + list(columnas or []))
+
+    if len(disponibles) == 1:
+        df = leer_particion(*disponibles[0], columnas, carpeta)
+    else:
+        with lectura(ruta):
+            df = pd.concat([leer_particion(año, mes, columnas, carpeta) for año, mes in disponibles], ignore_index=True)
+    if desde is not None or hasta is not None:
+        df = filas_rango(df, desde, hasta)
+    return df.reset_index(drop=True)
+
+# Devuelve la primera hora guardada, leyendo solo la columna Fecha del primer mes
+def primera_fecha(ruta=RUTA_ALMACEN):
+    disponibles = particiones(ruta)
+    if not disponibles:
+        return None
+    año, mes = disponibles[0]
+    return leer_particion(año, mes, ["Fecha"], ruta)["Fecha"].min()
+
+# Devuelve la última hora guardada, leyendo solo la columna Fecha del último mes
+def ultima_fecha(ruta=RUTA_ALMACEN):
+    disponibles = particiones(ruta)
+    if not disponibles:
+        return None
+    año, mes = disponibles[-1]
+    return leer_particion(año, mes, ["Fecha"], ruta)["Fecha"].max()
+
+def _escribir_meses(df, ruta):
+    for (año, mes), df_mes in df.groupby([df["Fecha"].dt.year, df["Fecha"].dt.month]):
+        escribir_particion(df_mes, año, mes, ruta)
+    publicar_version(ruta)
+
+# Función para guardar el DataFrame completo, mes a mes
+def guardar(df, ruta=RUTA_ALMACEN):
+    with escritura(ruta):
+        _escribir_meses(df, ruta)
+
+# En cada mes afectado se conservan las filas anteriores a `desde` de la carpeta y se
+# sustituyen las posteriores por las nuevas
+def _sustituir_desde(df_nuevo, desde, carpeta, escribir, ruta):
+    guardados = set(particiones(carpeta))
+    for (año, mes), df_mes in df_nuevo.groupby([df_nuevo["Fecha"].dt.year, df_nuevo["Fecha"].dt.month]):
+        if (año, mes) in guardados:
+            df_anterior = leer_particion(año, mes, ruta=carpeta)
+            df_mes = pd.concat([df_anterior[df_anterior["Fecha"] < desde], df_mes], ignore_index=True)
+        escribir(df_mes, año, mes, ruta)
+
+# Función para añadir datos nuevos: en cada mes afectado se conservan las filas
+# anteriores a `desde` y se sustituyen las posteriores por las nuevas. Con
+# `por_dispositivo` se hace lo mismo con las medias de cada dispositivo.
+def actualizar(df_nuevo, desde, ruta=RUTA_ALMACEN, por_dispositivo=None):
+    desde = pd.Timestamp(desde)
+    with escritura(ruta), diagnostico.etapa("almacen.actualizar", filas=len(df_nuevo)):
+        _sustituir_desde(df_nuevo, desde, ruta, escribir_particion, ruta)
+        if por_dispositivo is not None and len(por_dispositivo):
+            _sustituir_desde(por_dispositivo, desde, ruta_dispositivos(ruta), escribir_particion_dispositivos, ruta)
+        publicar_version(ruta)
+
+# Función para sustituir todas las medias por dispositivo (al reconstruirlas desde la API)
+def guardar_dispositivos(por_dispositivo, ruta=RUTA_ALMACEN):
+    with escritura(ruta):
+        for año, mes in particiones(ruta_dispositivos(ruta)):
+            os.remove(ruta_particion(año, mes, ruta_dispositivos(ruta)))
+        fechas = por_dispositivo["Fecha"]
+        for (año, mes), df_mes in por_dispositivo.groupby([fechas.dt.year, fechas.dt.month]):
+            escribir_particion_dispositivos(df_mes, año, mes, ruta)
+        publicar_version(ruta)
+
+# Sumas y cuentas por hora de las horas que aún pueden recibir lecturas, junto con las
+# marcas de las lecturas ya sumadas (ver mediciones.acumular). Se guarda con los datos
+# para que la siguiente sincronización solo sume las lecturas posteriores.
+def cargar_acumulado(ruta=RUTA_ALMACEN):
+    fichero = os.path.join(ruta, FICHERO_ACUMULADO)
+    if not os.path.exists(fichero):
+        return None
+    return joblib.load(fichero)
+
+def guardar_acumulado(acumulado, ruta=RUTA_ALMACEN):
+    fichero = os.path.join(ruta, FICHERO_ACUMULADO)
+    os.makedirs(ruta, exist_ok=True)
+    joblib.dump(acumulado, fichero + '.tmp')
+    os.replace(fichero + '.tmp', fichero)
+
+def _reconstruir_resumenes(ruta):
+    diarios = [resumenes.resumen_diario(leer_particion(año, mes, ruta=ruta)) for año, mes in particiones(ruta)]
+    if diarios:
+        resumenes.guardar(pd.concat(diarios, ignore_index=True), ruta)
+
+# Crea los resúmenes de un almacén que se guardó antes de que existieran
+def preparar_resumenes(ruta=RUTA_ALMACEN):
+    if resumenes.existen(ruta) or not particiones(ruta):
+        return False
+    with escritura(ruta):
+        if resumenes.existen(ruta):
+            return False
+        _reconstruir_resumenes(ruta)
+        publicar_version(ruta)
+    return True
+
+# Resúmenes por día y por mes (ver resumenes.py)
+def resumen_diario(ruta=RUTA_ALMACEN):
+    return resumenes.cargar_diario(ruta)
+
+def resumen_mensual(ruta=RUTA_ALMACEN):
+    return resumenes.cargar_mensual(ruta)
+
+# Migración única desde la copia en pickle (datos_huerto.pkl) al almacén por meses
+def migrar_pickle(ruta_pickle, ruta=RUTA_ALMACEN):
+    if particiones(ruta) or not os.path.exists(ruta_pickle):
+        return False
+    with escritura(ruta):
+        # Otro proceso puede haberla hecho mientras se esperaba el cerrojo
+        if particiones(ruta):
+            return False
+        _escribir_meses(joblib.load(ruta_pickle), ruta)
+    return True
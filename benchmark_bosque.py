@@ -0,0 +1,77 @@
+import os
+import tempfile
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+import bosque
+from estado import etiquetar
+
+# Comparación entre el pipeline de sklearn guardado con joblib y su exportación compacta
+# (bosque.py): tamaño en disco, tiempo de carga, latencia con pocas filas y con un mes,
+# y comprobación de que las predicciones y probabilidades son idénticas.
+# Uso: python benchmark_bosque.py
+
+ARBOLES = 300
+REPETICIONES = 20
+
+def datos_sinteticos(dias, semilla=0):
+    rng = np.random.default_rng(semilla)
+    fechas = pd.Series(pd.date_range('2024-03-28', periods=dias * 24, freq='h'))
+    hora = fechas.dt.hour.to_numpy()
+    df = pd.DataFrame({
+        "Temperatura": 15 + 6 * np.sin(2 * np.pi * (hora - 9) / 24) + rng.normal(0, 2, len(fechas)),
+        "Humedad": 25 - 2 * np.sin(2 * np.pi * (hora - 9) / 24) + rng.normal(0, 1, len(fechas)),
+        "Conductibilidad": 0.15 + rng.normal(0, 0.02, len(fechas)),
+    })
+    # Algunos huecos para que intervenga el imputador
+    df = df.mask(rng.random(df.shape) < 0.01)
+    return df, etiquetar(fechas)
+
+def medir(funcion, repeticiones=REPETICIONES):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        resultado = funcion()
+    return (time.perf_counter() - inicio) / repeticiones, resultado
+
+if __name__ == "__main__":
+    X, y = datos_sinteticos(120)
+    modelo = Pipeline([
+        ('imputer', SimpleImputer(strategy='mean')),
+        ('scaler', StandardScaler()),
+        ('classifier', RandomForestClassifier(n_estimators=ARBOLES, random_state=42))
+    ]).fit(X, y)
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta_pkl = os.path.join(carpeta, 'modelo.pkl')
+        ruta_compacto = os.path.join(carpeta, 'compacto')
+        joblib.dump(modelo, ruta_pkl)
+        bosque.exportar(modelo, ruta_compacto)
+
+        tamaño_pkl = os.path.getsize(ruta_pkl)
+        tamaño_compacto = sum(os.path.getsize(os.path.join(ruta_compacto, f)) for f in os.listdir(ruta_compacto))
+        t_carga_pkl, _ = medir(lambda: joblib.load(ruta_pkl), 5)
+        t_carga_compacto, compacto = medir(lambda: bosque.cargar(ruta_compacto), 5)
+
+        X_prueba, _ = datos_sinteticos(30, semilla=1)
+        assert np.array_equal(modelo.predict(X_prueba), bosque.predecir(compacto, X_prueba))
+        assert np.array_equal(modelo.predict_proba(X_prueba), bosque.predecir_proba(compacto, X_prueba))
+
+        pocas = X_prueba.iloc[:5]
+        t_pocas_pkl, _ = medir(lambda: modelo.predict(pocas))
+        t_pocas_compacto, _ = medir(lambda: bosque.predecir(compacto, pocas))
+        t_mes_pkl, _ = medir(lambda: modelo.predict(X_prueba), 5)
+        t_mes_compacto, _ = medir(lambda: bosque.predecir(compacto, X_prueba), 5)
+
+    print(f"Árboles: {ARBOLES}, nodos: {len(compacto['umbral'])}. Predicciones idénticas.")
+    print(f"{'':22s}{'joblib + sklearn':>18s}{'compacto':>12s}")
+    print(f"{'Tamaño':22s}{tamaño_pkl / 1e6:15.2f} MB{tamaño_compacto / 1e6:9.2f} MB")
+    print(f"{'Carga':22s}{t_carga_pkl * 1e3:15.1f} ms{t_carga_compacto * 1e3:9.1f} ms")
+    print(f"{'Predicción, 5 filas':22s}{t_pocas_pkl * 1e3:15.2f} ms{t_pocas_compacto * 1e3:9.2f} ms")
+    print(f"{'Predicción, 1 mes':22s}{t_mes_pkl * 1e3:15.1f} ms{t_mes_compacto * 1e3:9.1f} ms")
@@ -0,0 +1,187 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import altair as alt
+import matplotlib
+matplotlib.use("Agg")
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+import almacen
+import cache_respuestas
+import datos
+import estado
+import matrices
+import predicciones
+import sintetico
+from consultas import dias_disponibles, filas_dia, filas_dias, filas_mes, meses_disponibles
+from graficas import (figura_a_png, grafica_comparacion, grafica_dia, grafica_interactiva, grafica_mapa_calor,
+                      grafica_union, serie_reducida)
+
+# Benchmark de extremo a extremo con telemetría sintética (sintetico.py) servida por una
+# API local: descarga y decodificación, crear_dataframe, etiquetado día/noche, predicción,
+# filtros de la interfaz, almacén y gráficas, para varias longitudes del histórico.
+# Cada etapa se repite y se guarda el mejor tiempo. El resultado se escribe en JSON para
+# poder comparar dos commits sin conexión.
+# Uso:
+#   python benchmark_completo.py                          # todas las escalas
+#   python benchmark_completo.py --escalas 1m 1a --salida antes.json
+#   python benchmark_completo.py --comparar antes.json
+
+ESCALAS = {"1m": 30, "6m": 182, "1a": 365, "5a": 1826}
+REPETICIONES = 3
+RUTA_SALIDA = 'benchmark_resultados.json'
+
+# Streamlit pasa los datos de la gráfica interactiva por su cuenta; aquí se convierte a
+# JSON directamente, sin el límite de filas de Altair
+alt.data_transformers.disable_max_rows()
+
+# La descarga se mide sin la caché de respuestas, como la primera vez, y aparte con la
+# caché llena en una carpeta temporal (descarga_cache)
+cache_respuestas.MODO = "desactivada"
+CARPETA_CACHE = cache_respuestas.CARPETA
+
+def cronometrar(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos), resultado
+
+# Modelo fijo para medir la predicción: el mismo pipeline que modelo.py, entrenado con
+# un mes sintético con otra semilla
+def modelo_de_prueba():
+    config = sintetico.configuracion(dias=30, semilla=1)
+    servidor, url = sintetico.servir(config)
+    datos.URL_API, datos.DISPOSITIVOS = url, sintetico.dispositivos(config)
+    try:
+        df = datos.crear_dataframe(datos.obtenerDatos(config["inicio"])).dropna()
+    finally:
+        servidor.shutdown()
+    modelo = Pipeline([
+        ('imputer', SimpleImputer(strategy='mean')),
+        ('scaler', StandardScaler()),
+        ('classifier', RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1))
+    ])
+    return modelo.fit(df[predicciones.CARACTERISTICAS], estado.etiquetar(df["Fecha"]))
+
+def medir_escala(dias, modelo, repeticiones):
+    config = sintetico.configuracion(dias=dias)
+    servidor, url = sintetico.servir(config)
+    datos.URL_API, datos.DISPOSITIVOS = url, sintetico.dispositivos(config)
+    etapas = {}
+
+    def anotar(nombre, funcion, filas=None):
+        segundos, resultado = cronometrar(funcion, repeticiones)
+        etapas[nombre] = {"segundos": round(segundos, 6)}
+        if filas is not None:
+            etapas[nombre]["filas"] = int(filas)
+        return resultado
+
+    try:
+        df_mediciones = anotar("descarga_decodificacion", lambda: datos.obtenerDatos(config["inicio"]))
+        etapas["descarga_decodificacion"]["filas"] = len(df_mediciones)
+        with tempfile.TemporaryDirectory(prefix="huerto_cache_api_") as carpeta:
+            cache_respuestas.MODO, cache_respuestas.CARPETA = "normal", carpeta
+            try:
+                datos.obtenerDatos(config["inicio"])
+                anotar("descarga_cache", lambda: datos.obtenerDatos(config["inicio"]), len(df_mediciones))
+            finally:
+                cache_respuestas.MODO, cache_respuestas.CARPETA = "desactivada", CARPETA_CACHE
+    finally:
+        servidor.shutdown()
+
+    df = anotar("crear_dataframe", lambda: datos.crear_dataframe(df_mediciones), len(df_mediciones))
+
+    def etiquetar_sin_cache():
+        estado.minutos_sol.cache_clear()
+        return estado.etiquetar(df["Fecha"])
+    df["Estado"] = anotar("etiquetado", etiquetar_sin_cache, len(df))
+    df = df.dropna().reset_index(drop=True)
+
+    df["Predicciones"] = anotar("prediccion", lambda: modelo.predict(df[predicciones.CARACTERISTICAS]), len(df))
+
+    dias_ui = dias_disponibles(df)
+    muestra = [dias_ui[i] for i in np.linspace(0, len(dias_ui) - 1, min(100, len(dias_ui))).astype(int)]
+    anotar("filtro_dia", lambda: [filas_dia(df, dia) for dia in muestra], len(muestra))
+    meses = meses_disponibles(df)
+    anotar("filtro_mes", lambda: [filas_mes(df, año, mes) for año, mes in meses], len(meses))
+
+    with tempfile.TemporaryDirectory(prefix="huerto_benchmark_") as ruta:
+        anotar("almacen_guardar", lambda: almacen.guardar(df, ruta), len(df))
+        anotar("almacen_cargar_mes", lambda: almacen.cargar([meses[-1]], ruta=ruta))
+        anotar("almacen_cargar_todo", lambda: almacen.cargar(ruta=ruta), len(df))
+        anotar("resumen_mensual", lambda: almacen.resumen_mensual(ruta))
+
+    dia = dias_ui[-2] if len(dias_ui) > 1 else dias_ui[-1]
+    df_dia = filas_dia(df, dia)
+    anotar("grafica_dia", lambda: figura_a_png(grafica_dia(df_dia, str(dia))), len(df_dia))
+    df_semana = filas_dias(df, dias_ui[-8:-1])
+    anotar("grafica_union", lambda: figura_a_png(grafica_union(df_semana)), len(df_semana))
+    tabla = anotar("matrices_dia_hora", lambda: matrices.matrices_dia_hora(df, predicciones.CARACTERISTICAS), len(df))
+    dias_mes = list(dias_ui[-31:-1])
+    anotar("grafica_comparacion_2", lambda: figura_a_png(grafica_comparacion(tabla, dias_mes[-2:])), 2)
+    anotar("grafica_comparacion_30", lambda: figura_a_png(grafica_comparacion(tabla, dias_mes)), len(dias_mes))
+    año, mes = meses[-2] if len(meses) > 1 else meses[-1]
+    nombre, desde, hasta = matrices.periodo_estacion(año, mes)
+    anotar("grafica_mapa_calor", lambda: figura_a_png(grafica_mapa_calor(tabla, desde, hasta, nombre)))
+    anotar("grafica_interactiva", lambda: grafica_interactiva(serie_reducida(df)).to_dict(), len(df))
+
+    return {"dias": dias, "lecturas": len(df_mediciones), "horas": len(df),
+            "dispositivos": config["dispositivos"], "intervalo": config["intervalo"], "etapas": etapas}
+
+def commit_actual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Tabla de tiempos; con `anterior` se añade la relación con los tiempos de otro resultado
+def mostrar(resultado, anterior=None):
+    for escala, medidas in resultado["escalas"].items():
+        print(f"\n== {escala}: {medidas['dias']} días, {medidas['lecturas']} lecturas, {medidas['horas']} horas")
+        for etapa, valores in medidas["etapas"].items():
+            linea = f"{etapa:26s} {valores['segundos'] * 1000:10.1f} ms"
+            base = (anterior or {}).get("escalas", {}).get(escala, {}).get("etapas", {}).get(etapa)
+            if base and valores["segundos"] > 0:
+                linea += f"   x{base['segundos'] / valores['segundos']:.2f} frente a {anterior.get('commit') or 'la anterior'}"
+            print(linea)
+
+if __name__ == "__main__":
+    argumentos = argparse.ArgumentParser(description="Benchmark de extremo a extremo con datos sintéticos")
+    argumentos.add_argument("--escalas", nargs="+", choices=list(ESCALAS), default=list(ESCALAS))
+    argumentos.add_argument("--repeticiones", type=int, default=REPETICIONES)
+    argumentos.add_argument("--salida", default=RUTA_SALIDA, help="fichero JSON de resultados")
+    argumentos.add_argument("--comparar", help="fichero JSON de una ejecución anterior")
+    opciones = argumentos.parse_args()
+
+    modelo = modelo_de_prueba()
+    resultado = {
+        "fecha": datetime.now().isoformat(timespec='seconds'),
+        "commit": commit_actual(),
+        "python": platform.python_version(),
+        "repeticiones": opciones.repeticiones,
+        "escalas": {escala: medir_escala(ESCALAS[escala], modelo, opciones.repeticiones)
+                    for escala in opciones.escalas},
+    }
+
+    with open(opciones.salida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+
+    anterior = None
+    if opciones.comparar:
+        with open(opciones.comparar, encoding='utf-8') as f:
+            anterior = json.load(f)
+    mostrar(resultado, anterior)
+    print(f"\nResultados guardados en {opciones.salida}")
@@ -0,0 +1,54 @@
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from dateutil import parser
+
+from decodificador import decodificar_bloque
+
+# Comparación entre el bucle original (dateutil por punto) y el decodificador vectorizado,
+# sobre bloques sintéticos de lecturas cada 5 minutos.
+# Uso: python benchmark_decodificador.py
+
+DIAS = 90
+DISPOSITIVOS = 4
+
+def generar_bloque(dias, semilla):
+    rng = np.random.default_rng(semilla)
+    inicio = datetime(2024, 3, 28)
+    n = dias * 24 * 12
+    valores = np.round(rng.normal(15, 5, n), 2)
+    return [[float(valores[i]), (inicio + timedelta(minutes=5 * i)).strftime('%Y-%m-%dT%H:%M:%S.000Z')] for i in range(n)]
+
+def bucle_original(bloques):
+    resultado = []
+    for bloque in bloques:
+        fechas = [parser.parse(medicion[1]).strftime('%Y-%m-%d %H:%M:%S') for medicion in bloque]
+        valores = [medicion[0] for medicion in bloque]
+        resultado.append((pd.to_datetime(fechas).values.astype('datetime64[ns]'), np.asarray(valores, dtype=np.float64)))
+    return resultado
+
+def decodificador_vectorizado(bloques):
+    return [decodificar_bloque(bloque) for bloque in bloques]
+
+def medir(funcion, bloques):
+    inicio = time.perf_counter()
+    resultado = funcion(bloques)
+    return time.perf_counter() - inicio, resultado
+
+if __name__ == "__main__":
+    bloques = [generar_bloque(DIAS, semilla) for semilla in range(DISPOSITIVOS)]
+    puntos = sum(len(bloque) for bloque in bloques)
+
+    t_original, bloques_original = medir(bucle_original, bloques)
+    t_vectorizado, bloques_vectorizado = medir(decodificador_vectorizado, bloques)
+
+    for (fechas_original, valores_original), (fechas, valores) in zip(bloques_original, bloques_vectorizado):
+        np.testing.assert_array_equal(fechas_original, fechas)
+        np.testing.assert_array_equal(valores_original, valores)
+
+    print(f"Puntos decodificados: {puntos}")
+    print(f"Bucle original:       {t_original:.3f} s")
+    print(f"Decodificador:        {t_vectorizado:.3f} s")
+    print(f"Mejora:               x{t_original / t_vectorizado:.1f}")
@@ -0,0 +1,58 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from estado import HORAS_SOL, a_hora_local, etiquetar_efemerides, etiquetar_tabla, minutos_sol
+
+# Comparación entre el etiquetado día/noche fila a fila (comparando cadenas "HH:MM"),
+# el etiquetado vectorizado con los arrays (mes, día) precalculados y el de efemérides.
+# Uso: python benchmark_estado.py
+
+MESES_ESPANOL = {
+    'January': 'Enero', 'February': 'Febrero', 'March': 'Marzo', 'April': 'Abril',
+    'May': 'Mayo', 'June': 'Junio', 'July': 'Julio', 'August': 'Agosto',
+    'September': 'Septiembre', 'October': 'Octubre', 'November': 'Noviembre', 'December': 'Diciembre'
+}
+
+# Versión fila a fila tal y como estaba en obtener_estado
+def estado_original(fecha):
+    fecha_dt = pd.to_datetime(fecha)
+    mes_nombre_espanol = MESES_ESPANOL[fecha_dt.strftime('%B')]
+    hora = fecha_dt.strftime('%H:%M')
+    hora_salida, hora_puesta = HORAS_SOL[mes_nombre_espanol][fecha_dt.day - 1]
+    return 1 if hora_salida <= hora <= hora_puesta else 0
+
+if __name__ == "__main__":
+    # Un año bisiesto de datos horarios más un muestreo por minutos para cubrir los bordes
+    fechas = pd.Series(pd.date_range('2024-01-01', '2024-12-31 23:00', freq='h'))
+    minutos = pd.Series(pd.date_range('2024-01-01', '2024-12-31 23:59', freq='min')[::13])
+
+    inicio = time.perf_counter()
+    original = fechas.apply(lambda x: estado_original(x.strftime('%Y-%m-%d %H:%M:%S'))).values
+    t_original = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    vectorizado = etiquetar_tabla(fechas)
+    t_vectorizado = time.perf_counter() - inicio
+
+    assert np.array_equal(original, vectorizado)
+    assert np.array_equal(minutos.apply(estado_original).values, etiquetar_tabla(minutos))
+
+    # Cinco años de datos horarios con efemérides, primero sin caché y luego con ella
+    multianual = pd.Series(pd.date_range('2024-01-01', '2028-12-31 23:00', freq='h'))
+    minutos_sol.cache_clear()
+    inicio = time.perf_counter()
+    efemerides = etiquetar_efemerides(multianual)
+    t_efemerides = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    etiquetar_efemerides(multianual)
+    t_efemerides_cache = time.perf_counter() - inicio
+    # Las efemérides toman las fechas en UTC; la tabla, en hora local
+    coincidencia = (etiquetar_efemerides(fechas) == etiquetar_tabla(a_hora_local(fechas))).mean()
+
+    print(f"Filas etiquetadas:   {len(fechas)}")
+    print(f"Fila a fila:         {t_original:.3f} s")
+    print(f"Vectorizado:         {t_vectorizado * 1000:.1f} ms")
+    print(f"Efemérides (5 años): {t_efemerides:.3f} s, con caché {t_efemerides_cache * 1000:.1f} ms")
+    print(f"Coincidencia tabla/efemérides en 2024: {coincidencia:.2%}")
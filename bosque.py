@@ -0,0 +1,154 @@
+import json
+import os
+import sys
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.preprocessing import StandardScaler
+
+# Exportación compacta del modelo día/noche para predecir sin sklearn ni joblib.
+# El pipeline (imputador, escalador y RandomForest) se guarda en una carpeta con arrays
+# planos de NumPy, uno por fichero .npy, que se abren con memoria mapeada:
+#   caracteristica, umbral: un elemento por nodo de todos los árboles seguidos
+#   hijos:                  hijo izquierdo y derecho de cada nodo (las hojas apuntan a sí mismas)
+#   proba:                  probabilidades de cada clase en cada nodo
+#   bosque.json:            raíz de cada árbol, clases, columnas y las constantes del
+#                           imputador y el escalador
+# La predicción recorre todos los árboles a la vez, nivel a nivel, y repite las mismas
+# operaciones que sklearn (escalado en float64, comparación en float32 y suma de las
+# probabilidades árbol a árbol), así que el resultado es idéntico al del pipeline.
+
+FICHERO_META = 'bosque.json'
+ARRAYS = ["caracteristica", "umbral", "hijos", "proba"]
+FILAS_POR_BLOQUE = 2048
+
+# Función para pasar el pipeline entrenado a arrays planos y guardarlos en `carpeta`
+def exportar(pipeline, carpeta):
+    imputador, escalador, bosque = (paso for _, paso in pipeline.steps)
+    if not (isinstance(imputador, SimpleImputer) and isinstance(escalador, StandardScaler)
+            and isinstance(bosque, RandomForestClassifier)):
+        raise ValueError("Solo se puede exportar un pipeline SimpleImputer + StandardScaler + RandomForestClassifier")
+    if bosque.n_outputs_ != 1 or len(imputador.statistics_) != bosque.n_features_in_:
+        raise ValueError("El modelo tiene varias salidas o el imputador ha descartado columnas")
+
+    media = escalador.mean_ if escalador.with_mean else np.zeros(bosque.n_features_in_)
+    escala = escalador.scale_ if escalador.with_std else np.ones(bosque.n_features_in_)
+    # El imputador queda absorbido: el valor de relleno ya escalado, como lo vería el árbol
+    relleno = ((imputador.statistics_ - media) / escala).astype(np.float32)
+
+    arrays = {nombre: [] for nombre in ARRAYS}
+    raices, desplazamiento = [], 0
+    for arbol in bosque.estimators_:
+        t = arbol.tree_
+        nodos = np.arange(t.node_count)
+        hoja = t.children_left == -1
+        arrays["caracteristica"].append(np.where(hoja, 0, t.feature).astype(np.int16))
+        arrays["umbral"].append(t.threshold.astype(np.float64))
+        hijos = np.stack([np.where(hoja, nodos, t.children_left), np.where(hoja, nodos, t.children_right)], axis=1)
+        arrays["hijos"].append((hijos + desplazamiento).astype(np.int32))
+        # Igual que DecisionTreeClassifier.predict_proba: se normaliza cada hoja
+        proba = t.value[:, 0, :bosque.n_classes_].astype(np.float64)
+        normalizador = proba.sum(axis=1)[:, np.newaxis]
+        normalizador[normalizador == 0.0] = 1.0
+        arrays["proba"].append(proba / normalizador)
+        raices.append(desplazamiento)
+        desplazamiento += t.node_count
+
+    os.makedirs(carpeta, exist_ok=True)
+    for nombre, partes in arrays.items():
+        np.save(os.path.join(carpeta, nombre + '.npy'), np.concatenate(partes))
+    columnas = list(getattr(pipeline, "feature_names_in_", getattr(imputador, "feature_names_in_", [])))
+    meta = {
+        "raices": raices,
+        "clases": bosque.classes_.tolist(),
+        "columnas": columnas,
+        "media": media.tolist(),
+        "escala": escala.tolist(),
+        "relleno": relleno.tolist(),
+    }
+    with open(os.path.join(carpeta, FICHERO_META), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+def existe(carpeta):
+    return os.path.exists(os.path.join(carpeta, FICHERO_META))
+
+# Función para abrir un modelo exportado. Los arrays se mapean en memoria: abrirlo es
+# casi instantáneo y las páginas se leen del disco cuando se usan.
+def cargar(carpeta, mapear=True):
+    with open(os.path.join(carpeta, FICHERO_META), encoding='utf-8') as f:
+        compacto = json.load(f)
+    for nombre in ARRAYS:
+        # np.asarray deja una vista normal sobre el mapa, sin el coste de la subclase memmap
+        compacto[nombre] = np.asarray(np.load(os.path.join(carpeta, nombre + '.npy'), mmap_mode='r' if mapear else None))
+    compacto["raices"] = np.asarray(compacto["raices"], dtype=np.int32)
+    compacto["clases"] = np.asarray(compacto["clases"])
+    for nombre in ["media", "escala"]:
+        compacto[nombre] = np.asarray(compacto[nombre], dtype=np.float64)
+    compacto["relleno"] = np.asarray(compacto["relleno"], dtype=np.float32)
+    compacto["hoja"] = compacto["hijos"][:, 0] == np.arange(len(compacto["hijos"]))
+    return compacto
+
+def es_compacto(modelo):
+    return isinstance(modelo, dict) and "raices" in modelo
+
+# Imputador y escalador: mismas operaciones que sklearn, en float64, y paso a float32
+# como hacen los árboles antes de comparar con los umbrales
+def _transformar(compacto, X):
+    if hasattr(X, "columns") and compacto["columnas"]:
+        X = X[compacto["columnas"]]
+    X = np.array(X, dtype=np.float64)
+    huecos = np.isnan(X)
+    X -= compacto["media"]
+    X /= compacto["escala"]
+    X = X.astype(np.float32)
+    if huecos.any():
+        X[huecos] = np.broadcast_to(compacto["relleno"], X.shape)[huecos]
+    return X
+
+# Hoja a la que llega cada fila en cada árbol. Se avanza un nivel por vuelta y solo con
+# los pares (árbol, fila) que todavía no han llegado a una hoja.
+def _hojas(compacto, X):
+    arboles, (n, columnas) = len(compacto["raices"]), X.shape
+    caracteristica, umbral = compacto["caracteristica"], compacto["umbral"]
+    hijos, hoja = compacto["hijos"].ravel(), compacto["hoja"]
+    valores = X.ravel()
+    nodo = np.repeat(compacto["raices"], n)
+    inicio_fila = np.tile(np.arange(n) * columnas, arboles)
+    activos = np.arange(arboles * n)
+    while activos.size:
+        actual = nodo[activos]
+        # Como en sklearn, se va a la izquierda si valor <= umbral (no hay NaN tras imputar)
+        a_la_derecha = valores[inicio_fila[activos] + caracteristica[actual]] > umbral[actual]
+        siguiente = hijos[2 * actual + a_la_derecha]
+        nodo[activos] = siguiente
+        activos = activos[~hoja[siguiente]]
+    return nodo.reshape(arboles, n)
+
+def _proba_bloque(compacto, X):
+    # Suma árbol a árbol, en el mismo orden que RandomForestClassifier.predict_proba
+    # (cumsum suma siempre de forma secuencial)
+    proba = compacto["proba"][_hojas(compacto, X)].cumsum(axis=0)[-1]
+    proba /= len(compacto["raices"])
+    return proba
+
+def predecir_proba(compacto, X):
+    X = _transformar(compacto, X)
+    if len(X) <= FILAS_POR_BLOQUE:
+        return _proba_bloque(compacto, X)
+    return np.concatenate([_proba_bloque(compacto, X[i:i + FILAS_POR_BLOQUE])
+                           for i in range(0, len(X), FILAS_POR_BLOQUE)])
+
+def predecir(compacto, X):
+    return compacto["clases"].take(np.argmax(predecir_proba(compacto, X), axis=1), axis=0)
+
+# Exporta una versión del registro que todavía no tenga el modelo compacto.
+# Uso: python bosque.py [versión]   (por defecto, la vigente)
+if __name__ == "__main__":
+    import registro_modelos
+
+    version = sys.argv[1] if len(sys.argv) > 1 else registro_modelos.version_actual()
+    if version is None:
+        sys.exit("No hay ningún modelo en el registro.")
+    carpeta = registro_modelos.exportar(version)
+    print(f"Modelo {version} exportado en {carpeta}.")
@@ -0,0 +1,91 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+# Caché en disco de las respuestas de list_telemetry_data, tal y como llegan de la API
+# (comprimidas con gzip). Cada fichero se nombra con el hash de la petición: URL,
+# dispositivo, canal y ventana de la rejilla fija de descarga.py, así que la misma
+# ventana siempre cae en el mismo fichero.
+#
+# Las lecturas pasadas no cambian: una ventana cerrada se descarga una vez y después se
+# lee del disco. La carpeta tiene un tamaño máximo; al pasarlo se borran primero las
+# respuestas que hace más tiempo que no se usan (cada lectura actualiza la fecha del fichero).
+#
+# Modos (variable de entorno HUERTO_CACHE_API):
+#   normal       las ventanas cerradas se leen de la caché; solo la abierta va a la API
+#   grabar       como normal, y además se guarda la ventana abierta, para poder reproducir
+#                después toda la descarga sin conexión
+#   reproducir   nunca se llama a la API: todo sale de la caché y las ventanas que no
+#                estén grabadas se dan por vacías
+#   desactivada  todo se pide a la API, como antes de la caché
+
+MODOS = ["normal", "grabar", "reproducir", "desactivada"]
+MODO = os.environ.get("HUERTO_CACHE_API", "normal")
+CARPETA = os.environ.get("HUERTO_CACHE_API_CARPETA", 'cache_api')
+MAX_MB = float(os.environ.get("HUERTO_CACHE_API_MB", 512))
+
+EXTENSION = '.json.gz'
+SUFIJO_ABIERTA = '.abierta'
+
+_cerrojo_recorte = threading.Lock()
+
+def clave(url, device_eui, canal, inicio_ms, fin_ms):
+    texto = json.dumps([url, device_eui, int(canal), int(inicio_ms), int(fin_ms)])
+    return hashlib.sha256(texto.encode()).hexdigest()
+
+def _ruta(clave, abierta, carpeta):
+    return os.path.join(carpeta, clave + (SUFIJO_ABIERTA if abierta else '') + EXTENSION)
+
+# Función para leer una respuesta guardada. Devuelve los bytes de la respuesta o None.
+def leer(clave, abierta=False, carpeta=CARPETA):
+    ruta = _ruta(clave, abierta, carpeta)
+    try:
+        with open(ruta, 'rb') as f:
+            contenido = gzip.decompress(f.read())
+        os.utime(ruta)
+    except (FileNotFoundError, EOFError, gzip.BadGzipFile):
+        # Borrada por el recorte de otro proceso o a medio escribir: como si no estuviera
+        return None
+    return contenido
+
+# Función para guardar una respuesta. Se escribe en un temporal y se renombra, así que
+# quien lee nunca ve un fichero a medias.
+def guardar(clave, contenido, abierta=False, carpeta=CARPETA):
+    os.makedirs(carpeta, exist_ok=True)
+    ruta = _ruta(clave, abierta, carpeta)
+    temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporal, 'wb') as f:
+        f.write(gzip.compress(contenido))
+    os.replace(temporal, ruta)
+
+# Tamaño total de la caché en bytes
+def tamaño(carpeta=CARPETA):
+    if not os.path.isdir(carpeta):
+        return 0
+    return sum(entrada.stat().st_size for entrada in os.scandir(carpeta) if entrada.name.endswith(EXTENSION))
+
+# Función para dejar la caché por debajo de max_mb borrando las respuestas usadas hace más
+# tiempo. Devuelve el número de ficheros borrados.
+def recortar(max_mb=MAX_MB, carpeta=CARPETA):
+    if not os.path.isdir(carpeta):
+        return 0
+    with _cerrojo_recorte:
+        ficheros = []
+        for entrada in os.scandir(carpeta):
+            if entrada.name.endswith(EXTENSION):
+                estado = entrada.stat()
+                ficheros.append((estado.st_mtime, estado.st_size, entrada.path))
+        sobrante = sum(f[1] for f in ficheros) - max_mb * 1e6
+        borrados = 0
+        for _, tamaño_fichero, ruta in sorted(ficheros):
+            if sobrante <= 0:
+                break
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+            sobrante -= tamaño_fichero
+            borrados += 1
+        return borrados
@@ -0,0 +1,32 @@
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Cerrojos de fichero (advisory locks) para coordinar varios procesos que usan la misma
+# carpeta de datos: la aplicación de Streamlit, ingesta.py y modelo.py.
+# Con exclusivo=False varios lectores pueden tenerlo a la vez; en Windows siempre es exclusivo.
+
+@contextmanager
+def bloquear(ruta, exclusivo=True):
+    carpeta = os.path.dirname(ruta)
+    if carpeta:
+        os.makedirs(carpeta, exist_ok=True)
+    with open(ruta, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusivo else fcntl.LOCK_SH)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+# Consultas por fecha sobre un DataFrame horario ordenado por "Fecha".
+# En lugar de formatear como texto toda la columna de fechas en cada consulta,
+# se busca el rango de filas con búsqueda binaria (searchsorted) y se devuelve
+# un trozo del DataFrame.
+
+UN_DIA = pd.Timedelta(days=1)
+
+def _posiciones(df, fechas):
+    return np.searchsorted(df["Fecha"].values, np.asarray(fechas, dtype='datetime64[ns]'))
+
+# Filas con desde <= Fecha < hasta (sin límite si alguno es None)
+def filas_rango(df, desde=None, hasta=None):
+    inicio = 0 if desde is None else _posiciones(df, [pd.Timestamp(desde)])[0]
+    fin = len(df) if hasta is None else _posiciones(df, [pd.Timestamp(hasta)])[0]
+    return df.iloc[inicio:fin]
+
+def filas_dia(df, dia):
+    dia = pd.Timestamp(dia).normalize()
+    return filas_rango(df, dia, dia + UN_DIA)
+
+# Filas de un conjunto de días, en orden cronológico
+def filas_dias(df, dias):
+    dias = sorted({pd.Timestamp(dia).normalize() for dia in dias})
+    if not dias:
+        return df.iloc[0:0]
+    limites = _posiciones(df, [limite for dia in dias for limite in (dia, dia + UN_DIA)]).reshape(-1, 2)
+    return df.iloc[np.concatenate([np.arange(inicio, fin) for inicio, fin in limites])]
+
+def filas_mes(df, año, mes):
+    inicio = pd.Timestamp(year=año, month=mes, day=1)
+    return filas_rango(df, inicio, inicio + pd.offsets.MonthBegin(1))
+
+# Días con datos, como array de datetime64[D]
+def dias_disponibles(df):
+    return np.unique(df["Fecha"].values.astype('datetime64[D]'))
+
+# Meses con datos, como lista de pares (año, mes)
+def meses_disponibles(df):
+    meses = np.unique(df["Fecha"].values.astype('datetime64[M]')).astype(int)
+    return [(1970 + mes // 12, mes % 12 + 1) for mes in meses]
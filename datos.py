@@ -0,0 +1,220 @@
+import copy
+import json
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import almacen
+import diagnostico
+import refresco
+from almacen import RUTA_ALMACEN
+from decodificador import decodificar_bloque
+from descarga import a_ms, ahora_utc, descargar
+from estado import etiquetar
+from mediciones import acumular, indice_hora, medias, medias_por_dispositivo, tabla_larga
+
+URL_API = "https://sensecap.seeed.cc/openapi/list_telemetry_data"
+CREDENCIALES = ('93I2S5UCP1ISEF4F', '6552EBDADED14014B18359DB4C3B6D4B3984D0781C2545B6A33727A4BBA1E46E')
+DISPOSITIVOS = ['2CF7F1C0523000A2', '2CF7F1C05230009C', '2CF7F1C05230001D', '2CF7F1C043500730']
+TIPOS_MEDICION = ["4102", "4103", "4108"]
+FECHA_INICIO = datetime(2024, 3, 8)
+
+RUTA_DATOS = 'datos_huerto.pkl'
+RUTA_MARCAS = 'marcas_huerto.json'
+# Las marcas son la fecha (UTC) de la última lectura recibida de cada sensor
+FORMATO_MARCA = '%Y-%m-%d %H:%M:%S'
+
+# Retraso máximo de un sensor respecto al que va más al día. Si un sensor deja de enviar
+# (apagado, sin batería...), su marca se queda atrás; a partir de este margen se da por
+# parado y se sigue como si su marca fuera la del resto menos el margen, así que lo que
+# se descarga y lo que se guarda en el acumulado no crece con el tiempo que lleva parado.
+# Las lecturas que llegan con más retraso que esto no se recuperan.
+MARGEN_RETRASO = timedelta(days=2)
+
+# Función para separar una respuesta de la API en las mediciones de cada tipo.
+# La primera lista trae el orden de los tipos (4102/4103/4108) y las siguientes
+# los bloques de pares [valor, fecha] en ese mismo orden.
+def separar_mediciones(datos):
+    tipoMedicion = list()
+    bloques = list()
+
+    for i, lista in enumerate(datos["data"]["list"]):
+        for medicion in lista:
+            if(i == 0):
+                tipoMedicion.append(medicion[1])
+            else:
+                bloques.append(medicion)
+
+    return {tipo: bloques[posicion] for posicion, tipo in enumerate(tipoMedicion)
+            if tipo in TIPOS_MEDICION and posicion < len(bloques)}
+
+# Función para obtener datos desde la API (o desde la caché de respuestas)
+# Devuelve la tabla larga de mediciones (una fila por lectura y dispositivo) entre
+# fechaInicio y ahora (todo en UTC, sin zona horaria); las ventanas de la caché pueden
+# traer lecturas de antes y se descartan.
+# fechaInicio puede ser una fecha común o un diccionario con la de cada dispositivo.
+# Si se pasa el diccionario de marcas, se actualiza con la última fecha recibida
+# para cada dispositivo y tipo de medición (4102/4103/4108).
+def obtenerDatos(fechaInicio=FECHA_INICIO, marcas=None):
+    fechaActual = ahora_utc()
+    inicios = fechaInicio if isinstance(fechaInicio, dict) else dict.fromkeys(DISPOSITIVOS, fechaInicio)
+
+    partes = []
+
+    respuestas = descargar(URL_API, CREDENCIALES, DISPOSITIVOS, inicios, fechaActual)
+    hasta = np.datetime64(a_ms(fechaActual), 'ms')
+
+    with diagnostico.etapa("decodificacion") as registro:
+        for device_eui in DISPOSITIVOS:
+            desde = np.datetime64(a_ms(inicios[device_eui]), 'ms')
+            for datos in respuestas[device_eui]:
+                for tipo, mediciones in separar_mediciones(datos).items():
+                    fechas, valores = decodificar_bloque(mediciones)
+                    dentro = (fechas >= desde) & (fechas <= hasta)
+                    if not dentro.all():
+                        fechas, valores = fechas[dentro], valores[dentro]
+                    partes.append((device_eui, tipo, fechas, valores))
+
+                    if marcas is not None and len(fechas):
+                        ultima = pd.Timestamp(fechas.max()).strftime(FORMATO_MARCA)
+                        marcas.setdefault(device_eui, {})
+                        marcas[device_eui][tipo] = max(ultima, marcas[device_eui].get(tipo, ultima))
+
+        df_mediciones = tabla_larga(partes, DISPOSITIVOS)
+        registro["filas"] = len(df_mediciones)
+    return df_mediciones
+
+# Función para crear el DataFrame horario combinado (media de todos los dispositivos)
+def crear_dataframe(df_mediciones):
+    return medias(acumular(df_mediciones))
+
+# Función para quedarse solo con las lecturas posteriores a la marca de su sensor
+# (dispositivo y tipo de medición), es decir, las que aún no se han sumado
+def lecturas_posteriores(df_mediciones, marcas):
+    limites = np.full((len(DISPOSITIVOS), len(TIPOS_MEDICION)), np.iinfo(np.int64).min)
+    for i, device_eui in enumerate(DISPOSITIVOS):
+        for j, tipo in enumerate(TIPOS_MEDICION):
+            if tipo in marcas.get(device_eui, {}):
+                limites[i, j] = pd.Timestamp(marcas[device_eui][tipo]).value
+    limite = limites[df_mediciones["Dispositivo"].cat.codes, df_mediciones["Medicion"].cat.codes]
+    return df_mediciones[df_mediciones["Fecha"].to_numpy().view(np.int64) > limite]
+
+# Función para leer las marcas de la última sincronización
+def cargar_marcas(ruta=RUTA_MARCAS):
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+def guardar_marcas(marcas, ruta=RUTA_MARCAS):
+    with open(ruta + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(marcas, f, indent=2, sort_keys=True)
+    os.replace(ruta + '.tmp', ruta)
+
+# Marcas con las de los sensores parados adelantadas hasta MARGEN_RETRASO antes de la
+# marca más reciente
+def marcas_efectivas(marcas):
+    fechas = [pd.Timestamp(fecha) for tipos in marcas.values() for fecha in tipos.values()]
+    if not fechas:
+        return {}
+    limite = max(fechas) - MARGEN_RETRASO
+    return {device_eui: {tipo: max(pd.Timestamp(fecha), limite).strftime(FORMATO_MARCA) for tipo, fecha in tipos.items()}
+            for device_eui, tipos in marcas.items()}
+
+# Hora desde la que hay que volver a descargar. La última hora guardada puede estar
+# incompleta, así que se recalcula entera a partir de la marca (efectiva) más antigua.
+def inicio_sincronizacion(ultima_fecha, marcas):
+    fechas = [fecha for tipos in marcas_efectivas(marcas).values() for fecha in tipos.values()]
+    if fechas:
+        return pd.Timestamp(min(fechas)).floor('h').to_pydatetime()
+    if ultima_fecha is not None:
+        return pd.Timestamp(ultima_fecha).to_pydatetime()
+    return FECHA_INICIO
+
+# Fecha desde la que hay que descargar cada dispositivo: la hora de su marca (efectiva)
+# más antigua. Los dispositivos a los que les falta la marca de algún tipo empiezan en
+# `inicio`, la común.
+def inicios_por_dispositivo(marcas, inicio):
+    efectivas = marcas_efectivas(marcas)
+    inicios = {}
+    for device_eui in DISPOSITIVOS:
+        tipos = efectivas.get(device_eui, {})
+        if all(tipo in tipos for tipo in TIPOS_MEDICION):
+            inicios[device_eui] = pd.Timestamp(min(tipos.values())).floor('h').to_pydatetime()
+        else:
+            inicios[device_eui] = inicio
+    return inicios
+
+# Función para descargar y etiquetar las horas nuevas.
+# Con el acumulado de la sincronización anterior solo se descargan, para cada dispositivo,
+# las lecturas desde su marca, solo se suman las posteriores a la marca (efectiva) de su
+# sensor y solo se recalculan las horas en las que caen; sin él se empieza de cero con
+# todo lo descargado desde `inicio`. Devuelve las horas nuevas (media de todos los
+# dispositivos y de cada uno), el acumulado actualizado y la primera hora que ha cambiado.
+def datos_nuevos(inicio, marcas, anterior=None):
+    if anterior is not None:
+        inicio = inicios_por_dispositivo(anterior["marcas"], inicio)
+    df_mediciones = obtenerDatos(inicio, marcas)
+    acumulado = None
+    if anterior is not None:
+        df_mediciones = lecturas_posteriores(df_mediciones, marcas_efectivas(anterior["marcas"]))
+        acumulado = anterior["horas"]
+    if df_mediciones.empty:
+        return medias(None), medias_por_dispositivo(None, dispositivos=DISPOSITIVOS), acumulado, None
+
+    with diagnostico.etapa("agregacion", lecturas=len(df_mediciones)) as registro:
+        desde = indice_hora(df_mediciones["Fecha"]).min()
+        acumulado = acumular(df_mediciones, acumulado)
+        df_nuevo = medias(acumulado, desde)
+        por_dispositivo = medias_por_dispositivo(acumulado, desde, DISPOSITIVOS)
+        registro["filas"] = len(df_nuevo)
+    with diagnostico.etapa("etiquetado", filas=len(df_nuevo)):
+        df_nuevo['Estado'] = etiquetar(df_nuevo['Fecha'])
+    return df_nuevo.dropna().reset_index(drop=True), por_dispositivo, acumulado, df_nuevo["Fecha"].iloc[0]
+
+# Acumulado de la sincronización anterior, si es del formato actual (con las sumas de
+# cada dispositivo). Los de antes solo tenían la suma de todos: se descartan y se vuelve
+# a sumar desde el inicio de la sincronización.
+def acumulado_anterior(ruta):
+    anterior = almacen.cargar_acumulado(ruta)
+    if anterior is None or anterior["horas"].columns.nlevels != 3:
+        return None
+    return anterior
+
+# Función para sincronizar de forma incremental el almacén de datos horarios.
+# Solo se piden a la API los datos posteriores a la última marca guardada y se
+# reescriben únicamente los meses afectados. Devuelve las horas nuevas.
+# Hay que llamarla a través de refresco.refrescar (como ingesta.py), que hace que no
+# haya dos sincronizaciones a la vez sobre el mismo almacén: la más antigua sustituiría
+# las horas de la otra y las dos escriben el acumulado y las marcas.
+@diagnostico.medido("sincronizacion")
+def sincronizar(ruta=RUTA_ALMACEN, ruta_marcas=RUTA_MARCAS):
+    almacen.migrar_pickle(RUTA_DATOS, ruta)
+    ultima = almacen.ultima_fecha(ruta)
+    marcas = cargar_marcas(ruta_marcas) if ultima is not None else {}
+    anterior = acumulado_anterior(ruta) if ultima is not None else None
+    inicio = inicio_sincronizacion(ultima, marcas)
+
+    df_nuevo, por_dispositivo, acumulado, desde = datos_nuevos(inicio, marcas, anterior)
+    if not df_nuevo.empty or len(por_dispositivo):
+        almacen.actualizar(df_nuevo, desde, ruta, por_dispositivo)
+
+    # Las horas anteriores a la marca efectiva más antigua ya no recibirán lecturas: se cierran
+    if acumulado is not None:
+        abierta = indice_hora([inicio_sincronizacion(None, marcas)])[0]
+        almacen.guardar_acumulado({"marcas": copy.deepcopy(marcas), "horas": acumulado[acumulado.index >= abierta]}, ruta)
+    guardar_marcas(marcas, ruta_marcas)
+    return df_nuevo
+
+# Función para rehacer desde FECHA_INICIO las medias de cada dispositivo, por ejemplo en
+# un almacén creado antes de que se guardaran. Con la caché de respuestas de la API
+# (cache_respuestas.py) las semanas ya descargadas se leen del disco. Se hace con el
+# cerrojo de actualización, para no mezclarse con una sincronización en curso.
+def reconstruir_dispositivos(ruta=RUTA_ALMACEN):
+    with refresco.cerrojo(ruta):
+        df_mediciones = obtenerDatos(FECHA_INICIO)
+        por_dispositivo = medias_por_dispositivo(acumular(df_mediciones), dispositivos=DISPOSITIVOS)
+        almacen.guardar_dispositivos(por_dispositivo, ruta)
+    return por_dispositivo
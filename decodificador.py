@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+# Decodificador vectorizado de los bloques [valor, fecha] que devuelve la API.
+# Convierte cada bloque directamente en arrays de NumPy (datetime64 y float64)
+# con un único parseo de fechas, en lugar de llamar a dateutil punto a punto.
+
+FECHAS_VACIAS = np.empty(0, dtype='datetime64[ns]')
+VALORES_VACIOS = np.empty(0, dtype=np.float64)
+
+# Función para parsear de una vez todas las fechas ISO 8601 de un bloque.
+# Se conserva la hora tal y como viene (sin zona horaria) y sin fracciones de segundo,
+# igual que hacía parser.parse(...).strftime('%Y-%m-%d %H:%M:%S').
+def parsear_fechas(textos):
+    try:
+        fechas = pd.to_datetime(textos, format='ISO8601')
+    except ValueError:
+        fechas = pd.to_datetime(textos, format='ISO8601', utc=True)
+    if fechas.tz is not None:
+        fechas = fechas.tz_localize(None)
+    return fechas.floor('s').values.astype('datetime64[ns]')
+
+# Función para convertir un bloque de mediciones en arrays tipados
+def decodificar_bloque(mediciones):
+    if not mediciones:
+        return FECHAS_VACIAS, VALORES_VACIOS
+    valores, textos = zip(*((medicion[0], medicion[1]) for medicion in mediciones))
+    return parsear_fechas(list(textos)), np.asarray(valores, dtype=np.float64)
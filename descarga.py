@@ -0,0 +1,152 @@
+import calendar
+import json
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
+
+import cache_respuestas
+import diagnostico
+
+# Tamaño de cada trozo de tiempo que se pide a la API y número de peticiones simultáneas
+VENTANA = timedelta(days=7)
+MAX_HILOS = 8
+INTENTOS = 4
+TIEMPO_ESPERA = 30
+CANAL = 1
+# Tiempo desde el final de una ventana hasta que se da por cerrada (lecturas que llegan
+# con retraso). A partir de entonces su respuesta ya no cambia y se guarda en la caché.
+MARGEN_CIERRE = timedelta(days=1)
+RESPUESTA_VACIA = {"code": "0", "data": {"list": []}}
+
+_sesion = None
+_cerrojo_sesion = threading.Lock()
+
+# Sesión HTTP compartida: reutiliza las conexiones (keep-alive) entre peticiones e hilos
+def obtener_sesion():
+    global _sesion
+    with _cerrojo_sesion:
+        if _sesion is None:
+            sesion = requests.Session()
+            adaptador = HTTPAdapter(pool_connections=MAX_HILOS, pool_maxsize=MAX_HILOS)
+            sesion.mount('https://', adaptador)
+            sesion.mount('http://', adaptador)
+            _sesion = sesion
+    return _sesion
+
+# Instante actual en UTC y sin zona horaria, como las fechas de las lecturas y las marcas
+def ahora_utc():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+# Milisegundos desde 1970, como los espera la API. Las fechas sin zona horaria (lecturas,
+# marcas, FECHA_INICIO) son UTC, sea cual sea la zona horaria del equipo.
+def a_ms(fecha):
+    return calendar.timegm(fecha.utctimetuple()) * 1000
+
+# Función para partir un rango de fechas en las ventanas de una rejilla fija (múltiplos de
+# `ventana` desde 1970), para que una misma ventana se pida siempre con los mismos límites
+# y su respuesta se pueda reutilizar. Devuelve (inicio_ms, fin_ms, cerrada): las ventanas
+# cerradas se piden enteras aunque el rango empiece o acabe dentro de ellas; la abierta,
+# solo hasta `fin`. Las lecturas de fuera del rango las descarta quien decodifica.
+def dividir_ventanas(inicio, fin, ventana=VENTANA, ahora=None):
+    paso = int(ventana.total_seconds()) * 1000
+    inicio_ms, fin_ms = a_ms(inicio), a_ms(fin)
+    limite = a_ms((ahora or ahora_utc()) - MARGEN_CIERRE)
+    ventanas = []
+    a = inicio_ms // paso * paso
+    while a < fin_ms:
+        b = a + paso
+        cerrada = b <= limite
+        ventanas.append((a, b if cerrada else min(b, fin_ms), cerrada))
+        a = b
+    return ventanas
+
+# Errores que merece la pena reintentar: cortes de red, tiempos de espera, errores del
+# servidor (5xx) y límite de peticiones (429). El resto de respuestas 4xx (credenciales
+# incorrectas, parámetros mal formados...) no se arreglan repitiendo y fallan a la primera.
+def es_transitorio(error):
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code >= 500 or error.response.status_code == 429
+    return False
+
+# Petición de una ventana de un dispositivo. Devuelve el cuerpo de la respuesta sin
+# decodificar. Los errores transitorios se reintentan con espera exponencial.
+@retry(stop=stop_after_attempt(INTENTOS),
+       wait=wait_exponential(multiplier=0.5, max=8),
+       retry=retry_if_exception(es_transitorio),
+       reraise=True)
+def pedir_ventana(sesion, url, auth, device_eui, inicio_ms, fin_ms):
+    params = {
+        'device_eui': device_eui,
+        'channel_index': CANAL,
+        "time_start": str(inicio_ms),
+        "time_end": str(fin_ms)
+    }
+    with diagnostico.etapa("descarga.ventana", dispositivo=device_eui) as registro:
+        respuesta = sesion.get(url, params=params, auth=auth, timeout=TIEMPO_ESPERA)
+        respuesta.raise_for_status()
+        registro["bytes"] = len(respuesta.content)
+        return respuesta.content
+
+# Función para obtener una ventana de la caché o de la API, según el modo de
+# cache_respuestas. Devuelve la respuesta JSON y de dónde ha salido ("cache", "api" o
+# "vacia" si al reproducir no estaba grabada).
+def obtener_ventana(sesion, url, auth, device_eui, inicio_ms, fin_ms, cerrada, paso, modo, carpeta):
+    if modo == "desactivada":
+        return json.loads(pedir_ventana(sesion, url, auth, device_eui, inicio_ms, fin_ms)), "api"
+
+    # La clave es la ventana de la rejilla, también para la abierta
+    clave = cache_respuestas.clave(url, device_eui, CANAL, inicio_ms, inicio_ms + paso)
+    if cerrada or modo == "reproducir":
+        contenido = cache_respuestas.leer(clave, carpeta=carpeta)
+        if contenido is None and modo == "reproducir":
+            contenido = cache_respuestas.leer(clave, abierta=True, carpeta=carpeta)
+        if contenido is not None:
+            return json.loads(contenido), "cache"
+        if modo == "reproducir":
+            return RESPUESTA_VACIA, "vacia"
+
+    contenido = pedir_ventana(sesion, url, auth, device_eui, inicio_ms, fin_ms)
+    datos = json.loads(contenido)
+    # Solo se guardan las respuestas correctas: un error de la API no se repite desde el disco
+    if str(datos.get("code")) == "0" and (cerrada or modo == "grabar"):
+        cache_respuestas.guardar(clave, contenido, abierta=not cerrada, carpeta=carpeta)
+    return datos, "api"
+
+# Función para descargar en paralelo todas las ventanas de todos los dispositivos.
+# `inicio` es una fecha común o un diccionario con la fecha de inicio de cada dispositivo.
+# Las ventanas cerradas se leen de la caché de respuestas y solo las que faltan (y la
+# abierta) se piden a la API. Devuelve, para cada dispositivo, la lista de respuestas
+# JSON en orden cronológico.
+def descargar(url, auth, dispositivos, inicio, fin, ventana=VENTANA, max_hilos=MAX_HILOS, modo=None, carpeta=None):
+    modo = modo or cache_respuestas.MODO
+    carpeta = carpeta or cache_respuestas.CARPETA
+    if modo not in cache_respuestas.MODOS:
+        raise ValueError(f"Modo de caché desconocido: {modo} (debe ser uno de {', '.join(cache_respuestas.MODOS)})")
+    sesion = obtener_sesion()
+    paso = int(ventana.total_seconds()) * 1000
+    inicios = inicio if isinstance(inicio, dict) else dict.fromkeys(dispositivos, inicio)
+    tareas = [(device_eui, a, b, cerrada) for device_eui in dispositivos
+              for a, b, cerrada in dividir_ventanas(inicios[device_eui], fin, ventana)]
+
+    with diagnostico.etapa("descarga", dispositivos=len(dispositivos), ventanas=len(tareas), modo=modo) as registro, \
+            ThreadPoolExecutor(max_workers=max_hilos) as ejecutor:
+        futuros = [ejecutor.submit(obtener_ventana, sesion, url, auth, device_eui, a, b, cerrada, paso, modo, carpeta)
+                   for device_eui, a, b, cerrada in tareas]
+        respuestas = [futuro.result() for futuro in futuros]
+        origenes = Counter(origen for _, origen in respuestas)
+        registro.update(origenes)
+
+    if origenes["api"] and modo != "desactivada":
+        cache_respuestas.recortar(carpeta=carpeta)
+
+    resultado = {device_eui: [] for device_eui in dispositivos}
+    for (device_eui, _, _, _), (datos, _) in zip(tareas, respuestas):
+        resultado[device_eui].append(datos)
+    return resultado
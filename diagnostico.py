@@ -0,0 +1,81 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from functools import wraps
+
+# Medición de tiempos por etapa (descarga, decodificación, agregación, etiquetado,
+# predicción, gráficas...). Cada etapa deja un registro con su duración y, si la etapa
+# los anota, filas y bytes:
+#
+#     with diagnostico.etapa("prediccion", mes="2024-04") as registro:
+#         ...
+#         registro["filas"] = len(df_mes)
+#
+# Los últimos registros se guardan en memoria para el panel "Diagnóstico" de la página y,
+# si se indica un fichero con HUERTO_DIAGNOSTICO_LOG, también se escriben en él como JSON,
+# uno por línea. Con HUERTO_DIAGNOSTICO=0 no se mide nada y cada etapa solo cuesta
+# devolver un contexto vacío.
+
+ACTIVO = os.environ.get("HUERTO_DIAGNOSTICO", "1") != "0"
+RUTA_LOG = os.environ.get("HUERTO_DIAGNOSTICO_LOG")
+MAX_REGISTROS = 1000
+
+_registros = deque(maxlen=MAX_REGISTROS)
+_cerrojo_log = threading.Lock()
+
+def _anotar(registro):
+    _registros.append(registro)
+    if RUTA_LOG:
+        linea = json.dumps(registro, ensure_ascii=False, default=str)
+        with _cerrojo_log:
+            with open(RUTA_LOG, 'a', encoding='utf-8') as f:
+                f.write(linea + '\n')
+
+@contextmanager
+def _medir(nombre, datos):
+    registro = {"etapa": nombre, **datos}
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    except BaseException as e:
+        registro["error"] = type(e).__name__
+        raise
+    finally:
+        registro["segundos"] = round(time.perf_counter() - inicio, 6)
+        registro["hora"] = datetime.now().isoformat(timespec='milliseconds')
+        registro["hilo"] = threading.current_thread().name
+        _anotar(registro)
+
+# Contexto que mide una etapa. Devuelve el registro (un diccionario) para que la etapa
+# pueda anotar filas, bytes u otros datos.
+def etapa(nombre, **datos):
+    if not ACTIVO:
+        return nullcontext({})
+    return _medir(nombre, datos)
+
+# Decorador que mide cada llamada a la función como una etapa. Si el resultado tiene
+# longitud (DataFrame, lista, bytes...) se anota como filas.
+def medido(nombre):
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if not ACTIVO:
+                return funcion(*args, **kwargs)
+            with _medir(nombre, {}) as registro:
+                resultado = funcion(*args, **kwargs)
+                if hasattr(resultado, '__len__'):
+                    registro["filas"] = len(resultado)
+                return resultado
+        return envoltura
+    return decorador
+
+# Últimos registros, del más antiguo al más reciente
+def registros():
+    return list(_registros)
+
+def limpiar():
+    _registros.clear()
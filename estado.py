@@ -0,0 +1,132 @@
+from datetime import datetime, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+import ephem
+import numpy as np
+import pandas as pd
+
+# Etiquetado día/noche de una columna de fechas. Hay dos proveedores:
+#  - "tabla": la tabla de horas de salida y puesta del sol de 2024. Se convierte una
+#    sola vez, al importar el módulo, en dos arrays indexados por (mes, día) con los
+#    minutos desde medianoche.
+#  - "efemerides": calcula la salida y la puesta del sol con ephem para cualquier
+#    ubicación y año, con una caché por día.
+# La tabla compara directamente la hora de las fechas, como se ha hecho siempre. Las
+# efemérides toman las fechas como lo que son, la hora UTC que devuelve la API (el
+# decodificador quita la zona horaria), y las pasan a la hora local de ZONA_HORARIA
+# antes de compararlas con la salida y la puesta del sol.
+#
+# El almacén guarda la columna Estado ya calculada y el modelo se entrena con ella, así
+# que el proveedor por defecto sigue siendo la tabla: cambiarlo sin volver a etiquetar los
+# datos guardados mezclaría en el entrenamiento filas etiquetadas de las dos formas.
+
+# Ubicación del huerto (Oviedo) y proveedor usado por defecto
+LATITUD = 43.3619
+LONGITUD = -5.8494
+ZONA_HORARIA = 'Europe/Madrid'
+PROVEEDOR = 'tabla'
+
+MESES = ["Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio",
+         "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
+
+HORAS_SOL = {
+    "Enero": [("08:55", "17:57"), ("08:55", "17:58"), ("08:55", "17:59"), ("08:55", "18:00"), ("08:55", "18:01"), ("08:55", "18:02"), ("08:55", "18:03"), ("08:55", "18:04"), ("08:55", "18:05"), ("08:54", "18:06"), ("08:54", "18:07"), ("08:54", "18:08"), ("08:53", "18:09"), ("08:53", "18:11"), ("08:52", "18:12"), ("08:52", "18:13"), ("08:51", "18:14"), ("08:51", "18:15"), ("08:50", "18:17"), ("08:50", "18:18"), ("08:49", "18:19"), ("08:48", "18:20"), ("08:47", "18:22"), ("08:47", "18:23"), ("08:46", "18:24"), ("08:45", "18:26"), ("08:44", "18:27"), ("08:43", "18:28"), ("08:42", "18:30"), ("08:41", "18:31"), ("08:40", "18:32")],
+    "Febrero": [("08:39", "18:34"), ("08:38", "18:35"), ("08:37", "18:36"), ("08:36", "18:38"), ("08:35", "18:39"), ("08:33", "18:40"), ("08:32", "18:42"), ("08:31", "18:43"), ("08:30", "18:45"), ("08:28", "18:46"), ("08:27", "18:47"), ("08:26", "18:49"), ("08:24", "18:50"), ("08:23", "18:51"), ("08:21", "18:53"), ("08:20", "18:54"), ("08:19", "18:55"), ("08:17", "18:57"), ("08:16", "18:58"), ("08:14", "18:59"), ("08:13", "19:01"), ("08:11", "19:02"), ("08:09", "19:03"), ("08:08", "19:04"), ("08:06", "19:06"), ("08:05", "19:07"), ("08:03", "19:08"), ("08:01", "19:10"), ("08:00", "19:11")],
+    "Marzo": [("07:58", "19:12"), ("07:56", "19:13"), ("07:55", "19:15"), ("07:53", "19:16"), ("07:51", "19:17"), ("07:50", "19:18"), ("07:48", "19:20"), ("07:46", "19:21"), ("07:44", "19:22"), ("07:43", "19:23"), ("07:41", "19:25"), ("07:39", "19:26"), ("07:37", "19:27"), ("07:36", "18:28"), ("07:34", "19:29"), ("07:32", "19:31"), ("07:30", "19:32"), ("07:28", "19:33"), ("07:27", "19:34"), ("07:25", "19:35"), ("07:23", "19:37"), ("07:21", "19:38"), ("07:20", "19:39"), ("07:18", "19:40"), ("07:16", "19:41"), ("07:14", "19:43"), ("07:12", "19:44"), ("07:11", "19:45"), ("07:09", "19:46"), ("07:07", "19:47"), ("08:05", "20:49")],
+    "Abril": [("08:03", "20:50"), ("08:02", "20:51"), ("08:00", "20:52"), ("07:58", "20:53"), ("07:56", "20:54"), ("07:55", "20:56"), ("07:53", "20:57"), ("07:51", "20:58"), ("07:50", "20:59"), ("07:48", "21:00"), ("07:46", "21:01"), ("07:44", "21:03"), ("07:43", "21:04"), ("07:41", "21:05"), ("07:39", "21:06"), ("07:38", "21:07"), ("07:36", "21:09"), ("07:35", "21:10"), ("07:33", "21:11"), ("07:31", "21:12"), ("07:30", "21:13"), ("07:28", "21:14"), ("07:27", "21:16"), ("07:25", "21:17"), ("07:24", "21:18"), ("07:22", "21:19"), ("07:21", "21:20"), ("07:19", "21:21"), ("07:18", "21:23"), ("07:16", "21:24")],
+    "Mayo": [("07:15", "21:25"), ("07:14", "21:26"), ("07:12", "21:27"), ("07:11", "21:28"), ("07:10", "21:30"), ("07:08", "21:31"), ("07:07", "21:32"), ("07:06", "21:33"), ("07:05", "21:34"), ("07:03", "21:35"), ("07:02", "21:36"), ("07:01", "21:37"), ("07:00", "21:38"), ("06:59", "21:40"), ("06:58", "21:41"), ("06:57", "21:42"), ("06:56", "21:43"), ("06:55", "21:44"), ("06:54", "21:45"), ("06:53", "21:46"), ("06:52", "21:47"), ("06:51", "21:48"), ("06:51", "21:49"), ("06:50", "21:50"), ("06:49", "21:51"), ("06:48", "21:52"), ("06:48", "21:53"), ("06:47", "21:53"), ("06:46", "21:54"), ("06:46", "21:55"), ("06:45", "21:56")],
+    "Junio": [("06:45", "21:57"), ("06:44", "21:58"), ("06:44", "21:58"), ("06:44", "21:59"), ("06:43", "22:00"), ("06:43", "22:00"), ("06:43", "22:01"), ("06:42", "22:02"), ("06:42", "22:02"), ("06:42", "22:03"), ("06:42", "22:03"), ("06:42", "22:04"), ("06:42", "22:04"), ("06:42", "22:05"), ("06:42", "22:05"), ("06:42", "22:06"), ("06:42", "22:06"), ("06:42", "22:06"), ("06:42", "22:07"), ("06:42", "22:07"), ("06:43", "22:07"), ("06:43", "22:07"), ("06:43", "22:07"), ("06:43", "22:07"), ("06:44", "22:08"), ("06:44", "22:08"), ("06:45", "22:08"), ("06:45", "22:08"), ("06:46", "22:07"), ("06:46", "22:07")],
+    "Julio": [("06:47", "22:07"), ("06:47", "22:07"), ("06:48", "22:07"), ("06:48", "22:07"), ("06:49", "22:06"), ("06:50", "22:06"), ("06:50", "22:05"), ("06:51", "22:05"), ("06:52", "22:05"), ("06:53", "22:04"), ("06:53", "22:04"), ("06:54", "22:03"), ("06:55", "22:02"), ("06:56", "22:02"), ("06:57", "22:01"), ("06:58", "22:00"), ("06:58", "22:00"), ("06:59", "21:59"), ("07:00", "21:58"), ("07:01", "21:57"), ("07:02", "21:56"), ("07:03", "21:56"), ("07:04", "21:55"), ("07:05", "21:54"), ("07:06", "21:53"), ("07:07", "21:52"), ("07:08", "21:51"), ("07:09", "21:50"), ("07:10", "21:48"), ("07:11", "21:47"), ("07:12", "21:46")],
+    "Agosto": [("07:13", "21:45"), ("07:14", "21:44"), ("07:16", "21:43"), ("07:17", "21:41"), ("07:18", "21:40"), ("07:19", "21:39"), ("07:20", "21:37"), ("07:21", "21:36"), ("07:22", "21:35"), ("07:23", "21:33"), ("07:24", "21:32"), ("07:25", "21:30"), ("07:27", "21:29"), ("07:28", "21:27"), ("07:29", "21:26"), ("07:30", "21:24"), ("07:31", "21:23"), ("07:32", "21:21"), ("07:33", "21:20"), ("07:34", "21:18"), ("07:35", "21:16"), ("07:36", "21:15"), ("07:38", "21:13"), ("07:39", "21:12"), ("07:40", "21:10"), ("07:41", "21:08"), ("07:42", "21:07"), ("07:43", "21:05"), ("07:44", "21:03"), ("07:45", "21:01"), ("07:46", "21:00")],
+    "Septiembre": [("07:48", "20:58"), ("07:49", "20:56"), ("07:50", "20:54"), ("07:51", "20:53"), ("07:52", "20:51"), ("07:53", "20:49"), ("07:54", "20:47"), ("07:55", "20:46"), ("07:56", "20:44"), ("07:57", "20:42"), ("07:59", "20:40"), ("08:00", "20:38"), ("08:01", "20:36"), ("08:02", "20:35"), ("08:03", "20:33"), ("08:04", "20:31"), ("08:05", "20:29"), ("08:06", "20:27"), ("08:07", "20:26"), ("08:09", "20:24"), ("08:10", "20:22"), ("08:11", "20:20"), ("08:12", "20:18"), ("08:13", "20:16"), ("08:14", "20:15"), ("08:15", "20:13"), ("08:16", "20:11"), ("08:17", "20:09"), ("08:19", "20:07"), ("08:20", "20:66")],
+    "Octubre": [("08:21", "20:04"), ("08:22", "20:02"), ("08:23", "20:00"), ("08:24", "19:58"), ("08:26", "19:57"), ("08:27", "19:55"), ("08:28", "19:53"), ("08:29", "19:51"), ("08:30", "19:50"), ("08:31", "19:48"), ("08:33", "19:46"), ("08:34", "19:45"), ("08:35", "19:43"), ("08:36", "19:41"), ("08:37", "19:40"), ("08:39", "19:38"), ("08:40", "19:36"), ("08:41", "19:35"), ("08:42", "19:33"), ("08:44", "19:32"), ("08:45", "19:30"), ("08:46", "19:28"), ("08:47", "19:27"), ("08:49", "19:25"), ("08:50", "19:24"), ("08:51", "19:23"), ("07:52", "18:21"), ("07:54", "18:20"), ("07:55", "18:18"), ("07:56", "18:17"), ("07:57", "18:15")],
+    "Noviembre": [("07:59", "18:14"), ("08:00", "18:13"), ("08:01", "18:12"), ("08:03", "18:10"), ("08:04", "18:09"), ("08:05", "18:08"), ("08:07", "18:07"), ("08:08", "18:06"), ("08:09", "18:04"), ("08:10", "18:03"), ("08:12", "18:02"), ("08:13", "18:01"), ("08:14", "18:00"), ("08:16", "17:59"), ("08:17", "17:58"), ("08:18", "17:57"), ("08:19", "17:57"), ("08:21", "17:56"), ("08:22", "17:55"), ("08:23", "17:54"), ("08:24", "17:53"), ("08:26", "17:53"), ("08:27", "17:52"), ("08:28", "17:51"), ("08:29", "17:51"), ("08:30", "17:50"), ("08:32", "17:50"), ("08:33", "17:49"),("08:34", "17:49"), ("08:35", "17:49") ],
+    "Diciembre": [("08:36", "17:48"), ("08:37", "17:48"), ("08:38", "17:48"), ("08:39", "17:47"), ("08:40", "17:47"), ("08:41", "17:47"), ("08:42", "17:47"), ("08:43", "17:47"), ("08:44", "17:47"), ("08:45", "17:47"), ("08:46", "17:47"),("08:46", "17:47"), ("08:47", "17:47"), ("08:48", "17:48"), ("08:49", "17:48"), ("08:49", "17:48"), ("08:50", "17:48"), ("08:51", "17:49"), ("08:51", "17:49"), ("08:52", "17:50"), ("08:52", "17:50"), ("08:53", "17:51"), ("08:53", "17:51"), ("08:54", "17:52"), ("08:54", "17:52"), ("08:54", "17:53"), ("08:55", "17:54"), ("08:55", "17:55"), ("08:55", "17:55"), ("08:55", "17:56"), ("08:55", "17:57")]
+}
+
+# Pasa "HH:MM" a minutos. Los minutos se limitan a 59 para conservar el orden de la
+# comparación de cadenas original (por ejemplo, "20:66" equivale a "20:59").
+def _minutos(hora):
+    horas, minutos = hora.split(':')
+    return int(horas) * 60 + min(int(minutos), 59)
+
+# Arrays (mes, día) -> minuto de salida y de puesta del sol. Los días que no están
+# en la tabla quedan a -1 y se etiquetan como noche.
+SALIDA = np.full((13, 32), -1, dtype=np.int16)
+PUESTA = np.full((13, 32), -1, dtype=np.int16)
+for _numero_mes, _mes in enumerate(MESES, start=1):
+    for _dia, (_salida, _puesta) in enumerate(HORAS_SOL[_mes], start=1):
+        SALIDA[_numero_mes, _dia] = _minutos(_salida)
+        PUESTA[_numero_mes, _dia] = _minutos(_puesta)
+
+# Etiquetado con la tabla: 1 si es de día y 0 si es de noche
+def etiquetar_tabla(fechas):
+    fechas = pd.DatetimeIndex(fechas)
+    minuto = fechas.hour.values * 60 + fechas.minute.values
+    salida = SALIDA[fechas.month.values, fechas.day.values]
+    puesta = PUESTA[fechas.month.values, fechas.day.values]
+    return ((salida <= minuto) & (minuto <= puesta)).astype(np.int64)
+
+# Minutos locales de salida y puesta del sol de un día, calculados con ephem.
+# Se guardan en caché, así que cada día distinto solo se calcula una vez.
+@lru_cache(maxsize=4096)
+def minutos_sol(dia, latitud=LATITUD, longitud=LONGITUD, zona=ZONA_HORARIA):
+    zona = ZoneInfo(zona)
+    medianoche = datetime(dia.year, dia.month, dia.day, tzinfo=zona)
+
+    observador = ephem.Observer()
+    observador.lat = str(latitud)
+    observador.lon = str(longitud)
+    observador.pressure = 0
+    observador.horizon = '-0:34'
+    observador.date = ephem.Date(medianoche.astimezone(timezone.utc).replace(tzinfo=None))
+
+    sol = ephem.Sun()
+    try:
+        salida = observador.next_rising(sol).datetime()
+        puesta = observador.next_setting(sol).datetime()
+    except ephem.AlwaysUpError:
+        return 0, 24 * 60
+    except ephem.NeverUpError:
+        return -1, -1
+
+    def a_minutos(momento):
+        local = momento.replace(tzinfo=timezone.utc).astimezone(zona)
+        if local.date() != medianoche.date():
+            return 24 * 60 if local > medianoche else 0
+        return local.hour * 60 + local.minute
+
+    return a_minutos(salida), a_minutos(puesta)
+
+# Función para pasar fechas UTC sin zona horaria a la hora local de `zona`, sin zona
+def a_hora_local(fechas, zona=ZONA_HORARIA):
+    return pd.DatetimeIndex(fechas).tz_localize('UTC').tz_convert(zona).tz_localize(None)
+
+# Etiquetado con efemérides: un único cálculo solar por cada día local distinto de `fechas`
+# (en UTC, como vienen de la API)
+def etiquetar_efemerides(fechas, latitud=LATITUD, longitud=LONGITUD, zona=ZONA_HORARIA):
+    fechas = a_hora_local(fechas, zona)
+    minuto = fechas.hour.values * 60 + fechas.minute.values
+    dias, posiciones = np.unique(fechas.normalize().values, return_inverse=True)
+    horas = np.array([minutos_sol(pd.Timestamp(dia).date(), latitud, longitud, zona) for dia in dias],
+                     dtype=np.int16).reshape(-1, 2)
+    salida = horas[posiciones, 0]
+    puesta = horas[posiciones, 1]
+    return ((salida <= minuto) & (minuto <= puesta)).astype(np.int64)
+
+PROVEEDORES = {
+    'tabla': etiquetar_tabla,
+    'efemerides': etiquetar_efemerides,
+}
+
+# Función para etiquetar de una vez una columna de fechas: 1 si es de día y 0 si es de noche
+def etiquetar(fechas, proveedor=None):
+    return PROVEEDORES[proveedor or PROVEEDOR](fechas)
+
+# Función para determinar si una fecha concreta es de día o de noche
+def obtener_estado(fecha):
+    try:
+        return int(etiquetar([pd.to_datetime(fecha)])[0])
+    except Exception as e:
+        return f"Error al determinar el estado: {e}"
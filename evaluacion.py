@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+# Evaluación del modelo por día, por mes y en total a partir de las columnas "Estado"
+# (real) y "Predicciones" del almacén. Se cuentan de una vez, con np.bincount, los
+# aciertos y fallos de cada día (matriz de confusión) y de esas cuentas salen la
+# exactitud, la precisión, la exhaustividad y el F1, con las mismas fórmulas que sklearn
+# (0 cuando el denominador es 0).
+
+CUENTAS = ["vn", "fp", "fn", "vp"]
+METRICAS = ["accuracy", "precision", "recall", "f1"]
+
+# Función para contar verdaderos/falsos positivos y negativos de cada día
+def conteos_por_dia(df):
+    df = df.dropna(subset=["Estado", "Predicciones"])
+    if df.empty:
+        return pd.DataFrame(columns=CUENTAS, index=pd.DatetimeIndex([], name="Fecha"), dtype=np.int64)
+    dias = df["Fecha"].to_numpy().astype('datetime64[D]')
+    unicos, posicion = np.unique(dias, return_inverse=True)
+    # Código 0..3 = estado real * 2 + predicción, en el orden de CUENTAS
+    codigo = df["Estado"].to_numpy(np.int64) * 2 + df["Predicciones"].to_numpy(np.int64)
+    cuentas = np.bincount(posicion * 4 + codigo, minlength=len(unicos) * 4).reshape(len(unicos), 4)
+    return pd.DataFrame(cuentas, columns=CUENTAS, index=pd.DatetimeIndex(unicos.astype('datetime64[ns]'), name="Fecha"))
+
+def _dividir(numerador, denominador):
+    numerador = np.asarray(numerador, dtype=np.float64)
+    denominador = np.asarray(denominador, dtype=np.float64)
+    return np.divide(numerador, denominador, out=np.zeros_like(numerador), where=denominador > 0)
+
+# Función para añadir las métricas a una tabla de cuentas
+def con_metricas(cuentas):
+    vn, fp, fn, vp = (cuentas[c] for c in CUENTAS)
+    tabla = cuentas.copy()
+    tabla["horas"] = vn + fp + fn + vp
+    tabla["accuracy"] = _dividir(vp + vn, tabla["horas"])
+    tabla["precision"] = _dividir(vp, vp + fp)
+    tabla["recall"] = _dividir(vp, vp + fn)
+    tabla["f1"] = _dividir(2 * vp, 2 * vp + fp + fn)
+    return tabla
+
+# Evaluación completa: tablas por día y por mes y una fila con el total
+def evaluar(df):
+    cuentas = conteos_por_dia(df)
+    mensual = cuentas.groupby(cuentas.index.to_period("M").to_timestamp().rename("Mes")).sum()
+    total = cuentas.sum().to_frame().T
+    return {"dia": con_metricas(cuentas), "mes": con_metricas(mensual), "total": con_metricas(total).iloc[0]}
@@ -0,0 +1,271 @@
+import hashlib
+import threading
+from io import BytesIO
+
+import altair as alt
+import matplotlib.dates as mdates
+import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection, PolyCollection
+import numpy as np
+import pandas as pd
+from cachetools import LRUCache
+
+import diagnostico
+from evaluacion import METRICAS
+from matrices import HORAS, seleccion
+from mediciones import COLUMNAS
+
+# Construcción de las gráficas del huerto con matplotlib.
+# Las figuras se convierten a PNG una sola vez y esos mismos bytes se usan tanto
+# para mostrar la imagen como para el botón de descarga. Los PNG se guardan en una
+# caché LRU limitada por tamaño total, compartida por todas las sesiones.
+
+COLORES_GRAFICA = ['red', 'blue', 'green']
+COLORES_ESTADO = {0: 'orange', 1: 'lightblue'}
+MAPAS_COLOR = ['Reds', 'Blues', 'Greens']
+TITULOS = ["Temperatura del Suelo", "Humedad del Suelo", "Conductibilidad"]
+
+MAX_BYTES_CACHE = 64 * 1024 * 1024
+
+# Número de cubetas (aprox. píxeles de ancho) de la gráfica interactiva
+ANCHO_PIXELES = 1000
+
+_cache_png = LRUCache(maxsize=MAX_BYTES_CACHE, getsizeof=len)
+_cerrojo_cache = threading.Lock()
+
+def modificar_eje_x(fig, ax, fechas):
+    if len(fechas.dt.date.unique()) == 1:
+        # Mostrar todas las horas sin los minutos
+        ax.xaxis.set_major_locator(mdates.HourLocator())
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%H'))
+    else:
+        ax.xaxis.set_major_locator(mdates.DayLocator())
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%d-%m-%Y'))
+    fig.autofmt_xdate()
+
+# Función para convertir la figura en PNG y liberar la memoria de matplotlib
+def figura_a_png(fig):
+    with diagnostico.etapa("grafica.png") as registro:
+        buffer = BytesIO()
+        fig.savefig(buffer, format='png', bbox_inches='tight')
+        plt.close(fig)
+        registro["bytes"] = buffer.tell()
+    return buffer.getvalue()
+
+# Clave de la caché: huella del tipo de gráfica, los días elegidos y las versiones
+# de los datos y del modelo con los que se dibuja
+def clave_grafica(tipo, fechas, version_datos, version_modelo):
+    dias = sorted(pd.Timestamp(fecha).strftime('%Y-%m-%d') for fecha in fechas)
+    contenido = "|".join([tipo, ",".join(dias), str(version_datos), str(version_modelo)])
+    return hashlib.sha1(contenido.encode('utf-8')).hexdigest()
+
+# Devuelve el PNG guardado para la clave o, si no está, construye la figura con
+# `construir` y guarda su PNG
+def png_en_cache(clave, construir):
+    with _cerrojo_cache:
+        png = _cache_png.get(clave)
+    if png is None:
+        with diagnostico.etapa("grafica.dibujo"):
+            fig = construir()
+        png = figura_a_png(fig)
+        with _cerrojo_cache:
+            if len(png) <= MAX_BYTES_CACHE:
+                _cache_png[clave] = png
+    return png
+
+# Agrupa las horas consecutivas con la misma clase en tramos (inicio, anchura).
+# El tramo j va de la fecha j a la j+1 y toma la clase de la fecha j. Las horas sin
+# clase (NaN: guardadas pero todavía sin puntuar) no forman parte de ningún tramo.
+def tramos_por_clase(fechas, clases):
+    x = mdates.date2num(np.asarray(fechas, dtype='datetime64[ns]'))
+    clases = np.asarray(clases, dtype=np.float64)[:-1]
+    if len(clases) == 0:
+        return {}
+    sin_clase = np.isnan(clases)
+    cambios = (clases[1:] != clases[:-1]) & ~(sin_clase[1:] & sin_clase[:-1])
+    cortes = np.flatnonzero(cambios) + 1
+    inicios = np.r_[0, cortes]
+    fines = np.r_[cortes, len(clases)]
+    tramos = {}
+    for inicio, fin in zip(inicios, fines):
+        if not sin_clase[inicio]:
+            tramos.setdefault(int(clases[inicio]), []).append((x[inicio], x[fin] - x[inicio]))
+    return tramos
+
+# Sombrea el fondo de día/noche con una sola colección de rectángulos por clase y eje.
+# Los rectángulos van de abajo a arriba del eje, como axvspan, sin cambiar los límites.
+def sombrear_dia_noche(axes, fechas, clases):
+    tramos = tramos_por_clase(fechas, clases)
+    rectangulos = {clase: [[(x, 0), (x, 1), (x + ancho, 1), (x + ancho, 0)] for x, ancho in rangos]
+                   for clase, rangos in tramos.items()}
+    for ax in axes:
+        for clase, vertices in rectangulos.items():
+            coleccion = PolyCollection(vertices, transform=ax.get_xaxis_transform(),
+                                       facecolor=COLORES_ESTADO[clase], edgecolor='none', alpha=0.3)
+            ax.add_collection(coleccion, autolim=False)
+
+# Gráfica de las mediciones de un día con el fondo de día/noche predicho por el modelo
+def grafica_dia(df_seleccionado, fecha_str):
+    fig, axes = plt.subplots(1, 3, figsize=(20, 5), sharex=True)
+
+    titulos = ["Temperatura del Suelo", "Humedad del Suelo", "Conductibilidad"]
+
+    for i, ax in enumerate(axes):
+        ax.plot(df_seleccionado["Fecha"], df_seleccionado[COLUMNAS[i]], label=COLUMNAS[i], color=COLORES_GRAFICA[i])
+        ax.set_ylabel(COLUMNAS[i])
+        ax.legend()
+        ax.set_title(f"{titulos[i]} del {fecha_str}")
+
+    sombrear_dia_noche(axes, df_seleccionado["Fecha"], df_seleccionado["Predicciones"])
+
+    modificar_eje_x(fig, axes[-1], df_seleccionado["Fecha"])
+    axes[-1].set_xlabel("Hora" if len(df_seleccionado["Fecha"].dt.date.unique()) == 1 else "Fecha")
+
+    handles = [plt.Line2D([0], [0], color=COLORES_ESTADO[0], lw=4, label='Noche'),
+               plt.Line2D([0], [0], color=COLORES_ESTADO[1], lw=4, label='Día')]
+    fig.legend(handles=handles, loc='upper center', bbox_to_anchor=(0.5, 1.05), ncol=2)
+
+    plt.tight_layout()
+    return fig
+
+# Gráfica de las mediciones de un día de cada dispositivo por separado, una línea por
+# dispositivo (tabla de almacen.cargar_dispositivos)
+def grafica_dispositivos(df_dispositivos, fecha_str):
+    fig, axes = plt.subplots(1, 3, figsize=(20, 5), sharex=True)
+    for i, (ax, columna, titulo) in enumerate(zip(axes, COLUMNAS, TITULOS)):
+        for dispositivo, df_dispositivo in df_dispositivos.groupby("Dispositivo", observed=True):
+            ax.plot(df_dispositivo["Fecha"], df_dispositivo[columna], marker='.', label=dispositivo)
+        ax.set_ylabel(columna)
+        ax.set_title(f"{titulo} del {fecha_str}")
+    axes[0].legend(title="Dispositivo")
+    modificar_eje_x(fig, axes[-1], df_dispositivos["Fecha"])
+    axes[-1].set_xlabel("Hora")
+    plt.tight_layout()
+    return fig
+
+# Gráfica con la unión de los días seleccionados, uno detrás de otro
+def grafica_union(df_seleccionado):
+    fig, axs = plt.subplots(1, 3, figsize=(15, 5))
+    titulos = ["Temperatura del Suelo por Día", "Humedad del Suelo por Día", "Conductibilidad por Día"]
+    for i, (columna, color, titulo) in enumerate(zip(COLUMNAS, COLORES_GRAFICA, titulos)):
+        axs[i].plot(df_seleccionado["Fecha"], df_seleccionado[columna], color=color)
+        axs[i].set_xlabel("Hora" if len(df_seleccionado["Fecha"].dt.date.unique()) == 1 else "Fecha")
+        axs[i].set_ylabel(columna)
+        axs[i].set_title(titulo)
+        modificar_eje_x(fig, axs[i], df_seleccionado["Fecha"])  # Modificar el eje X
+
+    plt.tight_layout()
+    return fig
+
+# Gráfica comparando los días seleccionados hora a hora, una línea por día.
+# Las filas salen de las matrices día × hora (matrices.py) y todas las líneas de una
+# medición van en una sola colección, así que el coste casi no depende del número de días.
+def grafica_comparacion(matrices, fechas_seleccionadas):
+    fechas_seleccionadas = sorted(fechas_seleccionadas)
+    fig, axs = plt.subplots(1, 3, figsize=(18, 6))  # Una fila con tres columnas para cada medición
+
+    # Un color por día, en orden cronológico
+    colores = plt.get_cmap('turbo')(np.linspace(0.05, 0.95, len(fechas_seleccionadas)))
+    horas = np.arange(HORAS)
+
+    for i, (columna, titulo) in enumerate(zip(COLUMNAS, TITULOS)):
+        valores = seleccion(matrices, columna, fechas_seleccionadas)
+        # Los NaN cortan la línea, como las horas que faltan
+        lineas = np.stack([np.broadcast_to(horas, valores.shape), valores], axis=-1)
+        axs[i].add_collection(LineCollection(lineas, colors=colores))
+        axs[i].set_xlim(0, HORAS - 1)
+        if np.isfinite(valores).any():
+            axs[i].set_ylim(*limites_con_margen(np.nanmin(valores), np.nanmax(valores)))
+        axs[i].set_xlabel("Hora")
+        axs[i].set_ylabel(columna)
+        axs[i].set_title(titulo)
+
+    # Una sola leyenda para las tres mediciones
+    handles = [plt.Line2D([0], [0], color=color, label=pd.Timestamp(fecha).strftime('%d-%m-%Y'))
+               for color, fecha in zip(colores, fechas_seleccionadas)]
+    fig.legend(handles=handles, loc='center left', bbox_to_anchor=(1.0, 0.5),
+               ncol=max(1, len(handles) // 16 + (len(handles) % 16 > 0)))
+
+    plt.tight_layout()
+    return fig
+
+# Límites del eje con un margen del 5 %, como los que pone matplotlib a las líneas
+def limites_con_margen(minimo, maximo):
+    margen = (maximo - minimo) * 0.05 or abs(minimo) * 0.05 or 0.05
+    return minimo - margen, maximo + margen
+
+# Mapa de calor día × hora de cada medición entre dos fechas (hasta sin incluir), por
+# ejemplo un mes o una estación: una imagen por medición, con un día por fila
+def grafica_mapa_calor(matrices, desde, hasta, titulo):
+    # Solo los días que caen dentro de los datos
+    if matrices["inicio"] is not None:
+        desde = max(pd.Timestamp(desde), pd.Timestamp(matrices["inicio"]))
+        hasta = min(pd.Timestamp(hasta), pd.Timestamp(matrices["inicio"] + matrices["dias"]))
+    dias = pd.date_range(desde, hasta, freq='D', inclusive='left')
+
+    fig, axs = plt.subplots(1, 3, figsize=(18, max(4, 2 + len(dias) * 0.08)), sharey=True)
+    # El eje vertical en fechas de matplotlib: cada fila ocupa su día entero
+    extension = [0, HORAS, mdates.date2num(hasta), mdates.date2num(desde)]
+
+    for i, (columna, titulo_medicion, mapa) in enumerate(zip(COLUMNAS, TITULOS, MAPAS_COLOR)):
+        valores = seleccion(matrices, columna, dias)
+        colores = plt.get_cmap(mapa).copy()
+        colores.set_bad('lightgrey')
+        imagen = axs[i].imshow(valores, aspect='auto', interpolation='nearest', cmap=colores, extent=extension)
+        fig.colorbar(imagen, ax=axs[i], label=columna)
+        axs[i].set_xticks(range(0, HORAS + 1, 3))
+        axs[i].set_xlabel("Hora")
+        axs[i].set_title(titulo_medicion)
+
+    axs[0].yaxis_date()
+    axs[0].yaxis.set_major_formatter(mdates.DateFormatter('%d-%m-%Y'))
+    fig.suptitle(titulo)
+    plt.tight_layout()
+    return fig
+
+# Reducción min/max por cubeta de tiempo: el rango se divide en `cubetas` trozos iguales
+# y de cada uno se conservan solo el punto mínimo y el máximo, así que los picos se ven
+# igual que con todos los puntos y el tamaño no depende del número de filas.
+def reducir_min_max(fechas, valores, cubetas=ANCHO_PIXELES):
+    fechas = np.asarray(fechas, dtype='datetime64[ns]')
+    valores = np.asarray(valores, dtype=np.float64)
+    validos = ~np.isnan(valores)
+    fechas, valores = fechas[validos], valores[validos]
+    if len(valores) <= 2 * cubetas:
+        return fechas, valores
+
+    tiempo = fechas.astype(np.int64)
+    cubeta = ((tiempo - tiempo[0]) / (tiempo[-1] - tiempo[0] + 1) * cubetas).astype(np.int64)
+    grupos = pd.Series(valores).groupby(cubeta)
+    posiciones = np.union1d(grupos.idxmin().values, grupos.idxmax().values)
+    return fechas[posiciones], valores[posiciones]
+
+# Serie reducida en formato largo (Fecha, Medicion, Valor) para la gráfica interactiva
+def serie_reducida(df, cubetas=ANCHO_PIXELES):
+    partes = []
+    for columna in COLUMNAS:
+        fechas, valores = reducir_min_max(df["Fecha"], df[columna], cubetas)
+        partes.append(pd.DataFrame({"Fecha": fechas, "Medicion": columna, "Valor": valores}))
+    return pd.concat(partes, ignore_index=True)
+
+# Gráfica interactiva de Altair, una fila por medición con su propia escala
+def grafica_interactiva(df_reducido):
+    return alt.Chart(df_reducido).mark_line().encode(
+        x=alt.X("Fecha:T", title="Fecha"),
+        y=alt.Y("Valor:Q", title=None, scale=alt.Scale(zero=False)),
+        color=alt.Color("Medicion:N", scale=alt.Scale(domain=COLUMNAS, range=COLORES_GRAFICA), legend=None),
+        tooltip=["Fecha:T", "Medicion:N", alt.Tooltip("Valor:Q", format=".2f")],
+    ).properties(height=180).facet(
+        row=alt.Row("Medicion:N", title=None, sort=COLUMNAS)
+    ).resolve_scale(y='independent').interactive(bind_y=False)
+
+# Evolución de las métricas del modelo por día o por mes (tabla de evaluacion.evaluar)
+def grafica_evaluacion(tabla):
+    largo = tabla.reset_index().melt(id_vars=tabla.index.name, value_vars=METRICAS,
+                                     var_name="Métrica", value_name="Valor")
+    return alt.Chart(largo).mark_line(point=True).encode(
+        x=alt.X(f"{tabla.index.name}:T", title=None),
+        y=alt.Y("Valor:Q", title=None, scale=alt.Scale(domain=[0, 1])),
+        color=alt.Color("Métrica:N", sort=METRICAS),
+        tooltip=[alt.Tooltip(f"{tabla.index.name}:T"), "Métrica:N", alt.Tooltip("Valor:Q", format=".3f")],
+    ).properties(height=260).interactive(bind_y=False)
@@ -0,0 +1,143 @@
+import argparse
+import os
+import threading
+import time
+import traceback
+from datetime import datetime
+
+import joblib
+
+import almacen
+import datos
+import predicciones
+import refresco
+import registro_modelos
+from almacen import RUTA_ALMACEN
+from datos import RUTA_MARCAS, sincronizar
+
+# Ingesta en segundo plano. Cada ciclo descarga las mediciones nuevas de la API
+# (sincronizar), las guarda en el almacén y las puntúa con el modelo vigente. El
+# almacén publica un número de versión nuevo y la aplicación solo tiene que leerlo
+# para saber que hay datos nuevos; la interfaz nunca espera a la API.
+#
+# Uso como proceso independiente:
+#   python ingesta.py                    # cada 5 minutos
+#   python ingesta.py --intervalo 60
+#   python ingesta.py --una-vez --url http://127.0.0.1:8000/openapi/list_telemetry_data
+#   python ingesta.py --reconstruir-dispositivos   # rehace las medias de cada dispositivo
+
+INTERVALO = 300
+RUTA_MODELO_LEGADO = 'mejor_modelo_dia_noche.pkl'
+
+_estado = {"ultima_ejecucion": None, "filas_nuevas": None, "ultimo_error": None}
+_cerrojo_estado = threading.Lock()
+_modelo_cargado = {}
+
+# Modelo vigente (del registro o, si no hay registro, el fichero antiguo) y su versión.
+# Se guarda en memoria entre ciclos y solo se vuelve a cargar si cambia la versión.
+def modelo_vigente():
+    version = registro_modelos.version_actual()
+    if version is not None:
+        if _modelo_cargado.get("version") != version:
+            modelo = registro_modelos.cargar_compacto(version)
+            if modelo is None:
+                modelo = registro_modelos.cargar(version)
+            _modelo_cargado.update(version=version, modelo=modelo)
+    elif os.path.exists(RUTA_MODELO_LEGADO):
+        version = predicciones.version_modelo(RUTA_MODELO_LEGADO)
+        if _modelo_cargado.get("version") != version:
+            _modelo_cargado.update(version=version, modelo=joblib.load(RUTA_MODELO_LEGADO))
+    else:
+        return None, None
+    return _modelo_cargado["modelo"], version
+
+# Puntúa con el modelo vigente las filas del almacén que lo necesiten. Devuelve el número
+# de filas puntuadas.
+def puntuar(ruta=RUTA_ALMACEN):
+    modelo, version = modelo_vigente()
+    if modelo is None:
+        return 0
+    return predicciones.puntuar(modelo, version, ruta)
+
+# Un ciclo de ingesta. Devuelve el número de horas nuevas guardadas.
+def ciclo(ruta=RUTA_ALMACEN, ruta_marcas=RUTA_MARCAS):
+    df_nuevo = sincronizar(ruta, ruta_marcas)
+    puntuar(ruta)
+    return len(df_nuevo)
+
+def _anotar(futuro):
+    try:
+        filas = futuro.result()
+        error = None
+    except Exception as e:
+        filas = None
+        error = f"{e}"
+        traceback.print_exception(e)
+    with _cerrojo_estado:
+        _estado.update(ultima_ejecucion=datetime.now(), filas_nuevas=filas, ultimo_error=error)
+
+def _anotar_error(futuro):
+    error = futuro.exception()
+    if error is not None:
+        traceback.print_exception(error)
+        with _cerrojo_estado:
+            _estado.update(ultimo_error=f"{error}")
+
+# Pide un ciclo al coordinador de actualizaciones: si ya hay uno en curso (lanzado por
+# otra sesión o por el bucle de ingesta) se une a él en lugar de empezar otro.
+def _lanzar(ruta, ruta_marcas):
+    futuro, nuevo = refresco.refrescar(lambda: ciclo(ruta, ruta_marcas), ruta)
+    if nuevo:
+        futuro.add_done_callback(_anotar)
+    return futuro, nuevo
+
+# Estado de la última ingesta lanzada desde este proceso
+def estado(ruta=RUTA_ALMACEN):
+    with _cerrojo_estado:
+        return dict(_estado, en_curso=refresco.en_curso(ruta))
+
+# Lanza un ciclo en un hilo aparte y vuelve enseguida. Si ya hay uno en curso no
+# lanza otro. Devuelve True si se ha lanzado.
+def lanzar_en_segundo_plano(ruta=RUTA_ALMACEN, ruta_marcas=RUTA_MARCAS):
+    return _lanzar(ruta, ruta_marcas)[1]
+
+# Lanza en un hilo aparte la puntuación del almacén con el modelo vigente (por ejemplo,
+# cuando la aplicación ve que ha cambiado el modelo), sin descargar nada. Si ya hay un
+# ciclo en curso no lanza otro: el ciclo también puntúa. Devuelve True si se ha lanzado.
+def lanzar_puntuacion(ruta=RUTA_ALMACEN):
+    futuro, nuevo = refresco.refrescar(lambda: puntuar(ruta), ruta, intervalo_minimo=0, anotar=False)
+    if nuevo:
+        futuro.add_done_callback(_anotar_error)
+    return nuevo
+
+# Bucle del proceso de ingesta: un ciclo cada `intervalo` segundos
+def ejecutar(intervalo=INTERVALO, ruta=RUTA_ALMACEN, ruta_marcas=RUTA_MARCAS, una_vez=False):
+    almacen.migrar_pickle(datos.RUTA_DATOS, ruta)
+    while True:
+        inicio = time.monotonic()
+        futuro, _ = _lanzar(ruta, ruta_marcas)
+        try:
+            filas = futuro.result()
+            print(f"{datetime.now():%Y-%m-%d %H:%M:%S} {filas} horas nuevas, versión de datos {almacen.version(ruta)}")
+        except Exception:
+            pass
+        if una_vez:
+            return
+        time.sleep(max(0, intervalo - (time.monotonic() - inicio)))
+
+if __name__ == "__main__":
+    argumentos = argparse.ArgumentParser(description="Ingesta periódica de datos de SenseCAP")
+    argumentos.add_argument("--intervalo", type=int, default=INTERVALO, help="segundos entre ciclos")
+    argumentos.add_argument("--una-vez", action="store_true", help="ejecuta un solo ciclo y termina")
+    argumentos.add_argument("--url", default=datos.URL_API, help="URL de list_telemetry_data")
+    argumentos.add_argument("--almacen", default=RUTA_ALMACEN, help="carpeta del almacén de datos")
+    argumentos.add_argument("--reconstruir-dispositivos", action="store_true",
+                            help="rehace desde el principio las medias de cada dispositivo y termina")
+    opciones = argumentos.parse_args()
+
+    datos.URL_API = opciones.url
+    if opciones.reconstruir_dispositivos:
+        filas = len(datos.reconstruir_dispositivos(opciones.almacen))
+        print(f"{filas} horas de dispositivos guardadas, versión de datos {almacen.version(opciones.almacen)}")
+    else:
+        ejecutar(opciones.intervalo, opciones.almacen, una_vez=opciones.una_vez)
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+# Matrices día × hora de cada medición. A partir de los datos horarios se construye, una
+# vez por versión de los datos, una matriz densa por medición con una fila por día (todos
+# los días entre el primero y el último, seguidos) y una columna por hora, con NaN en
+# las horas sin datos. La fila de un día se calcula restando fechas, así que sacar las
+# filas de 2 días o de 30 cuesta lo mismo y no hace falta recorrer la tabla.
+
+HORAS = 24
+ESTACIONES = {12: "Invierno", 1: "Invierno", 2: "Invierno", 3: "Primavera", 4: "Primavera", 5: "Primavera",
+              6: "Verano", 7: "Verano", 8: "Verano", 9: "Otoño", 10: "Otoño", 11: "Otoño"}
+
+# Función para pasar la tabla horaria (Fecha y una columna por medición) a matrices.
+# Devuelve {"inicio": primer día (datetime64[D]), "dias": número de filas, medición: matriz}.
+def matrices_dia_hora(df, columnas):
+    if df.empty:
+        return {"inicio": None, "dias": 0, **{columna: np.empty((0, HORAS)) for columna in columnas}}
+    horas = df["Fecha"].to_numpy().astype('datetime64[h]').astype(np.int64)
+    dias = horas // HORAS
+    inicio = int(dias.min())
+    n = int(dias.max()) - inicio + 1
+    posicion = horas - inicio * HORAS
+    matrices = {"inicio": np.datetime64(inicio, 'D'), "dias": n}
+    for columna in columnas:
+        matriz = np.full(n * HORAS, np.nan)
+        matriz[posicion] = df[columna].to_numpy(np.float64)
+        matrices[columna] = matriz.reshape(n, HORAS)
+    return matrices
+
+# Filas de las matrices para una lista de días (las de días fuera del rango son -1)
+def filas(matrices, dias):
+    if matrices["inicio"] is None:
+        return np.full(len(dias), -1)
+    posiciones = (np.asarray(pd.DatetimeIndex(dias).normalize(), dtype='datetime64[D]') - matrices["inicio"]).astype(np.int64)
+    return np.where((posiciones >= 0) & (posiciones < matrices["dias"]), posiciones, -1)
+
+# Matriz de una medición para los días pedidos, en su orden; los que no están quedan en NaN
+def seleccion(matrices, columna, dias):
+    posiciones = filas(matrices, dias)
+    resultado = np.full((len(posiciones), HORAS), np.nan)
+    dentro = posiciones >= 0
+    resultado[dentro] = matrices[columna][posiciones[dentro]]
+    return resultado
+
+# Días de un mes (desde, hasta sin incluir)
+def periodo_mes(año, mes):
+    desde = pd.Timestamp(year=año, month=mes, day=1)
+    return desde, desde + pd.offsets.MonthBegin(1)
+
+# Estación meteorológica de un mes: nombre y días (desde, hasta sin incluir). El invierno
+# empieza en diciembre, así que el de enero y febrero empieza el año anterior.
+def periodo_estacion(año, mes):
+    primer_mes = 3 * ((mes % 12) // 3) or 12
+    desde = pd.Timestamp(year=año - 1 if primer_mes > mes else año, month=primer_mes, day=1)
+    return ESTACIONES[mes], desde, desde + pd.offsets.MonthBegin(3)
@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+# Tabla larga de mediciones: una fila por lectura de cada sensor, con la fecha, el
+# dispositivo y el tipo de medición como categorías y el valor en float32. Así no se
+# pierden lecturas cuando dos dispositivos coinciden en el mismo segundo y ocupa mucho
+# menos que los diccionarios por fecha. La vista horaria de siempre (una columna por
+# medición) sale de las sumas por hora de más abajo, con todos los dispositivos juntos
+# o por separado.
+
+# Nombre de cada tipo de medición de la API. COLUMNAS son las columnas de medición de
+# todas las tablas horarias (almacén, resúmenes, gráficas y características del modelo),
+# en este orden; los demás módulos las importan de aquí.
+NOMBRES = {"4102": "Temperatura", "4103": "Humedad", "4108": "Conductibilidad"}
+COLUMNAS = list(NOMBRES.values())
+
+# Función para crear la tabla larga a partir de los bloques decodificados.
+# `partes` es una lista de (dispositivo, tipo, fechas, valores). Si un mismo sensor
+# repite una lectura en el mismo segundo (ventanas que se solapan) se queda la última.
+def tabla_larga(partes, dispositivos):
+    agrupadas = {}
+    for dispositivo, tipo, fechas, valores in partes:
+        if len(fechas) and tipo in NOMBRES:
+            agrupadas.setdefault((dispositivo, tipo), []).append((fechas, valores))
+
+    codigos_dispositivo = {dispositivo: i for i, dispositivo in enumerate(dispositivos)}
+    codigos_tipo = {tipo: i for i, tipo in enumerate(NOMBRES)}
+    fechas, valores, dispositivo, medicion = [], [], [], []
+    for (disp, tipo), bloques in agrupadas.items():
+        f = np.concatenate([bloque[0] for bloque in bloques])
+        v = np.concatenate([bloque[1] for bloque in bloques])
+        unicas = ~pd.Index(f).duplicated(keep='last')
+        f, v = f[unicas], v[unicas]
+        fechas.append(f)
+        valores.append(v.astype(np.float32))
+        dispositivo.append(np.full(len(f), codigos_dispositivo[disp], dtype=np.int8))
+        medicion.append(np.full(len(f), codigos_tipo[tipo], dtype=np.int8))
+
+    if not fechas:
+        fechas, valores = [np.empty(0, dtype='datetime64[ns]')], [np.empty(0, dtype=np.float32)]
+        dispositivo = medicion = [np.empty(0, dtype=np.int8)]
+
+    return pd.DataFrame({
+        "Fecha": np.concatenate(fechas).astype('datetime64[ns]'),
+        "Dispositivo": pd.Categorical.from_codes(np.concatenate(dispositivo), categories=list(dispositivos)),
+        "Medicion": pd.Categorical.from_codes(np.concatenate(medicion), categories=COLUMNAS),
+        "Valor": np.concatenate(valores),
+    })
+
+# Agregación horaria incremental. En lugar de recalcular la media de todo el histórico,
+# se guardan por cada hora la suma y el número de lecturas de cada dispositivo y medición,
+# con la hora como número entero (horas desde 1970). Las lecturas nuevas solo suman en sus
+# horas y las medias se sacan dividiendo, así que añadir una hora de datos cuesta una hora
+# de trabajo. De las mismas sumas salen la media de todos los dispositivos juntos (medias)
+# y la de cada uno por separado (medias_por_dispositivo).
+
+# Función para pasar fechas a índice entero de hora
+def indice_hora(fechas):
+    return np.asarray(fechas, dtype='datetime64[ns]').astype('datetime64[h]').astype(np.int64)
+
+# Función para sumar las lecturas de la tabla larga a las sumas y cuentas por hora.
+# Devuelve un DataFrame con índice Hora y columnas ("suma"|"cuenta", dispositivo, medición).
+def acumular(df, acumulado=None):
+    if len(df):
+        hora = indice_hora(df["Fecha"])
+        dispositivos = list(df["Dispositivo"].cat.categories)
+        primera = int(hora.min())
+        n, k = int(hora.max()) - primera + 1, len(dispositivos) * len(COLUMNAS)
+        serie = df["Dispositivo"].cat.codes.to_numpy(np.int64) * len(COLUMNAS) + df["Medicion"].cat.codes.to_numpy()
+        posicion = (hora - primera) * k + serie
+        sumas = np.bincount(posicion, weights=df["Valor"].to_numpy(np.float64), minlength=n * k).reshape(n, k)
+        cuentas = np.bincount(posicion, minlength=n * k).reshape(n, k)
+        indice = pd.RangeIndex(primera, primera + n, name="Hora")
+        columnas = pd.MultiIndex.from_product([dispositivos, COLUMNAS], names=["Dispositivo", "Medicion"])
+        nuevo = pd.concat({"suma": pd.DataFrame(sumas, index=indice, columns=columnas),
+                           "cuenta": pd.DataFrame(cuentas, index=indice, columns=columnas)}, axis=1)
+        nuevo = nuevo[cuentas.any(axis=1)]
+    else:
+        nuevo = None
+
+    if acumulado is None:
+        return nuevo
+    if nuevo is None:
+        return acumulado
+    return acumulado.add(nuevo, fill_value=0)
+
+def _fechas(horas):
+    return np.asarray(horas).astype('datetime64[h]').astype('datetime64[ns]')
+
+# Función para obtener la vista horaria ancha (Fecha y una columna por medición, media de
+# todos los dispositivos) de las horas acumuladas a partir de la hora `desde` (índice entero)
+def medias(acumulado, desde=None):
+    if acumulado is None:
+        return pd.DataFrame({"Fecha": np.empty(0, dtype='datetime64[ns]'), **{c: [] for c in COLUMNAS}})
+    if desde is not None:
+        acumulado = acumulado[acumulado.index >= desde]
+    sumas = acumulado["suma"].T.groupby(level="Medicion").sum().T.reindex(columns=COLUMNAS, fill_value=0)
+    cuentas = acumulado["cuenta"].T.groupby(level="Medicion").sum().T.reindex(columns=COLUMNAS, fill_value=0)
+    df = sumas / cuentas.where(cuentas > 0)
+    df.columns.name = None
+    df.insert(0, "Fecha", _fechas(acumulado.index))
+    return df.reset_index(drop=True)
+
+# Función para obtener la vista horaria de cada dispositivo: Fecha, Dispositivo y una
+# columna por medición, con una fila por hora y dispositivo con alguna lectura
+def medias_por_dispositivo(acumulado, desde=None, dispositivos=None):
+    if acumulado is None or acumulado.empty:
+        return pd.DataFrame({"Fecha": np.empty(0, dtype='datetime64[ns]'),
+                             "Dispositivo": pd.Categorical([], categories=dispositivos or []),
+                             **{c: np.empty(0) for c in COLUMNAS}})
+    if desde is not None:
+        acumulado = acumulado[acumulado.index >= desde]
+    cuentas = acumulado["cuenta"].stack("Dispositivo", future_stack=True).reindex(columns=COLUMNAS, fill_value=0)
+    sumas = acumulado["suma"].stack("Dispositivo", future_stack=True).reindex(columns=COLUMNAS, fill_value=0)
+    df = (sumas / cuentas.where(cuentas > 0))[cuentas.to_numpy().any(axis=1)]
+    df.columns.name = None
+    df = df.reset_index()
+    df.insert(0, "Fecha", _fechas(df.pop("Hora")))
+    categorias = dispositivos or sorted(df["Dispositivo"].unique())
+    df["Dispositivo"] = pd.Categorical(df["Dispositivo"], categories=categorias)
+    return df.sort_values(["Fecha", "Dispositivo"]).reset_index(drop=True)
@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+import almacen
+import bosque
+import diagnostico
+from almacen import RUTA_ALMACEN
+from mediciones import COLUMNAS as CARACTERISTICAS
+
+# Predicciones del modelo guardadas junto a los datos. El modelo se ejecuta una sola vez
+# sobre cada fila, por meses completos, y el resultado se guarda en la columna
+# "Predicciones" del almacén. En predicciones.json se apunta, para cada mes, con qué
+# versión del modelo se calculó y cómo estaba el fichero en ese momento, para volver
+# a calcular solo lo que haya cambiado.
+
+FICHERO_PREDICCIONES = 'predicciones.json'
+
+# Versión del modelo: huella del contenido del fichero
+def version_modelo(ruta_modelo):
+    huella = hashlib.sha1()
+    with open(ruta_modelo, 'rb') as f:
+        for trozo in iter(lambda: f.read(1 << 20), b''):
+            huella.update(trozo)
+    return huella.hexdigest()[:12]
+
+# Predicción con el modelo compacto (bosque.py) o con el pipeline de sklearn
+def predecir(modelo, X):
+    if bosque.es_compacto(modelo):
+        return bosque.predecir(modelo, X)
+    return modelo.predict(X)
+
+def cargar_registro(ruta=RUTA_ALMACEN):
+    fichero = os.path.join(ruta, FICHERO_PREDICCIONES)
+    if not os.path.exists(fichero):
+        return {}
+    with open(fichero, encoding='utf-8') as f:
+        return json.load(f)
+
+def guardar_registro(registro, ruta=RUTA_ALMACEN):
+    destino = os.path.join(ruta, FICHERO_PREDICCIONES)
+    temporal = destino + '.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(registro, f, indent=2, sort_keys=True)
+    os.replace(temporal, destino)
+
+# Lo que se apunta de un mes al puntuarlo: la versión del modelo y cómo estaba el fichero
+def _apunte(año, mes, version, ruta):
+    return {"modelo": version, "modificado": os.stat(almacen.ruta_particion(año, mes, ruta)).st_mtime_ns}
+
+# True si hay meses sin puntuar con el modelo `version` o que han cambiado desde que se
+# puntuaron. Solo lee predicciones.json y la fecha de cada fichero, sin abrir los meses.
+def pendientes(version, ruta=RUTA_ALMACEN):
+    registro = cargar_registro(ruta)
+    return any(registro.get(f"{año:04d}-{mes:02d}") != _apunte(año, mes, version, ruta)
+               for año, mes in almacen.particiones(ruta))
+
+# Función para puntuar los datos guardados. Si el modelo ha cambiado se vuelve a predecir
+# el mes entero; si solo se han añadido filas, se predicen únicamente las que no tienen
+# predicción. Devuelve el número de filas puntuadas.
+def puntuar(modelo, version, ruta=RUTA_ALMACEN):
+    with almacen.escritura(ruta):
+        registro = cargar_registro(ruta)
+        filas = 0
+
+        for año, mes in almacen.particiones(ruta):
+            clave = f"{año:04d}-{mes:02d}"
+            anterior = registro.get(clave)
+            if anterior == _apunte(año, mes, version, ruta):
+                continue
+
+            df_mes = almacen.leer_particion(año, mes, ruta=ruta)
+            if "Predicciones" in df_mes:
+                prediccion = df_mes["Predicciones"].to_numpy(dtype=np.float64)
+            else:
+                prediccion = np.full(len(df_mes), np.nan)
+
+            if anterior is None or anterior["modelo"] != version:
+                pendientes = np.ones(len(df_mes), dtype=bool)
+            else:
+                pendientes = np.isnan(prediccion)
+
+            if pendientes.any():
+                with diagnostico.etapa("prediccion", mes=clave, filas=int(pendientes.sum())):
+                    prediccion[pendientes] = predecir(modelo, df_mes.loc[pendientes, CARACTERISTICAS])
+                df_mes["Predicciones"] = prediccion.astype(np.int64)
+                almacen.escribir_particion(df_mes, año, mes, ruta)
+                filas += int(pendientes.sum())
+
+            registro[clave] = _apunte(año, mes, version, ruta)
+
+        if registro:
+            guardar_registro(registro, ruta)
+        if filas:
+            almacen.publicar_version(ruta)
+        return filas
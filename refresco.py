@@ -0,0 +1,81 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from cerrojos import bloquear
+
+# Coordinador de actualizaciones ("single flight"). Aunque haya muchas sesiones abiertas
+# pulsando "Actualizar datos" a la vez, o el proceso ingesta.py en marcha:
+#  - dentro de un proceso solo hay una actualización en curso por almacén; quien pide otra
+#    mientras tanto se une a la que ya está en marcha y recibe su mismo resultado;
+#  - entre procesos, la actualización se hace con el cerrojo de fichero del almacén, y si
+#    otro proceso ha terminado una hace menos de INTERVALO_MINIMO segundos no se repite.
+# Así la API y el disco reciben como mucho una actualización por intervalo.
+
+INTERVALO_MINIMO = 60
+FICHERO_CERROJO = '.refresco.lock'
+FICHERO_ULTIMO = 'ultimo_refresco'
+
+_en_curso = {}
+_cerrojo = threading.Lock()
+
+# Segundos desde la última actualización terminada en la carpeta (de cualquier proceso)
+def segundos_desde_ultimo(ruta):
+    try:
+        return time.time() - os.stat(os.path.join(ruta, FICHERO_ULTIMO)).st_mtime
+    except FileNotFoundError:
+        return None
+
+def _anotar_ultimo(ruta):
+    fichero = os.path.join(ruta, FICHERO_ULTIMO)
+    with open(fichero, 'a'):
+        pass
+    os.utime(fichero)
+
+# Cerrojo de actualización del almacén, entre procesos y entre hilos. Lo tiene cada
+# actualización lanzada con refrescar; quien escriba por otro camino lo mismo que una
+# sincronización (por ejemplo, datos.reconstruir_dispositivos) debe tenerlo también.
+def cerrojo(ruta):
+    return bloquear(os.path.join(ruta, FICHERO_CERROJO))
+
+def _ejecutar(futuro, funcion, ruta, intervalo_minimo, anotar):
+    try:
+        with cerrojo(ruta):
+            transcurrido = segundos_desde_ultimo(ruta)
+            if transcurrido is not None and transcurrido < intervalo_minimo:
+                # Otro proceso acaba de actualizar mientras se esperaba el cerrojo
+                resultado = 0
+            else:
+                resultado = funcion()
+                if anotar:
+                    _anotar_ultimo(ruta)
+    except BaseException as e:
+        futuro.set_exception(e)
+    else:
+        futuro.set_result(resultado)
+    finally:
+        with _cerrojo:
+            if _en_curso.get(ruta) is futuro:
+                del _en_curso[ruta]
+
+# Pide una actualización del almacén `ruta` ejecutando `funcion`. Devuelve el Future con
+# su resultado y True si se ha lanzado ahora o False si se ha unido a una ya en curso.
+# Con anotar=False (trabajos que no descargan nada, como volver a puntuar) no cuenta como
+# actualización para INTERVALO_MINIMO.
+def refrescar(funcion, ruta, intervalo_minimo=INTERVALO_MINIMO, anotar=True):
+    with _cerrojo:
+        futuro = _en_curso.get(ruta)
+        if futuro is not None:
+            return futuro, False
+        futuro = Future()
+        futuro.set_running_or_notify_cancel()
+        _en_curso[ruta] = futuro
+    threading.Thread(target=_ejecutar, args=(futuro, funcion, ruta, intervalo_minimo, anotar),
+                     daemon=True, name="refresco").start()
+    return futuro, True
+
+# True si hay una actualización en curso en este proceso
+def en_curso(ruta):
+    with _cerrojo:
+        return ruta in _en_curso
@@ -0,0 +1,88 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+import joblib
+
+import bosque
+from cerrojos import bloquear
+
+# Registro versionado de modelos. Cada entrenamiento se guarda en su propia carpeta
+# (modelos/v0001, modelos/v0002, ...) con el modelo y un metadatos.json con los
+# parámetros, las métricas, la ventana de entrenamiento y las características usadas.
+# Además se guarda una copia compacta para predecir (carpeta "compacto", ver bosque.py),
+# que es la que usan la aplicación y la ingesta; el .pkl se conserva para reentrenar.
+# El fichero "ULTIMO" apunta a la versión vigente y se sustituye de forma atómica,
+# así que quien lee siempre ve una versión completa.
+
+RUTA_REGISTRO = 'modelos'
+FICHERO_ULTIMO = 'ULTIMO'
+FICHERO_MODELO = 'modelo.pkl'
+FICHERO_METADATOS = 'metadatos.json'
+CARPETA_COMPACTO = 'compacto'
+FICHERO_CERROJO = '.registro.lock'
+
+def versiones(ruta=RUTA_REGISTRO):
+    if not os.path.isdir(ruta):
+        return []
+    return sorted(nombre for nombre in os.listdir(ruta) if nombre.startswith('v') and nombre[1:].isdigit())
+
+# Versión vigente, o None si todavía no hay ninguna
+def version_actual(ruta=RUTA_REGISTRO):
+    try:
+        with open(os.path.join(ruta, FICHERO_ULTIMO), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def cargar(version, ruta=RUTA_REGISTRO):
+    return joblib.load(os.path.join(ruta, version, FICHERO_MODELO))
+
+# Modelo compacto de una versión, o None si no se pudo exportar
+def cargar_compacto(version, ruta=RUTA_REGISTRO):
+    carpeta = os.path.join(ruta, version, CARPETA_COMPACTO)
+    if not bosque.existe(carpeta):
+        return None
+    return bosque.cargar(carpeta)
+
+# Exporta el modelo compacto de una versión ya registrada
+def exportar(version, ruta=RUTA_REGISTRO):
+    carpeta = os.path.join(ruta, version, CARPETA_COMPACTO)
+    temporal = carpeta + '.tmp'
+    bosque.exportar(cargar(version, ruta), temporal)
+    os.rename(temporal, carpeta)
+    return carpeta
+
+def metadatos(version, ruta=RUTA_REGISTRO):
+    with open(os.path.join(ruta, version, FICHERO_METADATOS), encoding='utf-8') as f:
+        return json.load(f)
+
+# Función para guardar un modelo nuevo en el registro y marcarlo como vigente.
+# La carpeta se escribe con un nombre temporal propio de este proceso y, con el cerrojo
+# del registro, se elige el número de versión y se renombra. Así dos entrenamientos a la
+# vez (la ingesta en segundo plano y modelo.py, por ejemplo) no eligen la misma versión.
+def registrar(modelo, datos, ruta=RUTA_REGISTRO):
+    os.makedirs(ruta, exist_ok=True)
+    temporal = os.path.join(ruta, f".nuevo.{os.getpid()}.{threading.get_ident()}.tmp")
+    os.makedirs(temporal, exist_ok=True)
+    joblib.dump(modelo, os.path.join(temporal, FICHERO_MODELO))
+    try:
+        bosque.exportar(modelo, os.path.join(temporal, CARPETA_COMPACTO))
+    except ValueError:
+        # Otro tipo de modelo: se usará el .pkl
+        pass
+
+    with bloquear(os.path.join(ruta, FICHERO_CERROJO)):
+        existentes = versiones(ruta)
+        version = f"v{int(existentes[-1][1:]) + 1 if existentes else 1:04d}"
+        datos = dict(datos, version=version, fecha=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        with open(os.path.join(temporal, FICHERO_METADATOS), 'w', encoding='utf-8') as f:
+            json.dump(datos, f, indent=2, ensure_ascii=False, default=str)
+        os.rename(temporal, os.path.join(ruta, version))
+
+        destino = os.path.join(ruta, FICHERO_ULTIMO)
+        with open(destino + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(version)
+        os.replace(destino + '.tmp', destino)
+    return version
@@ -0,0 +1,96 @@
+import os
+
+import pandas as pd
+
+from mediciones import COLUMNAS
+
+# Resúmenes diarios y mensuales del almacén: media, mínimo, máximo y número de horas de
+# cada medición, horas de día y de noche y cuántas predicciones coinciden con el estado.
+# Se guardan junto a los meses (resumenes/diario.parquet y resumenes/mensual.parquet) y se
+# actualizan cada vez que se escribe un mes, recalculando solo los días de ese mes, así
+# que el panel de resumen y los selectores no dependen de cuántos datos haya guardados.
+
+ESTADISTICOS = {"media": "mean", "min": "min", "max": "max", "horas": "count"}
+CARPETA = 'resumenes'
+FICHERO_DIARIO = 'diario.parquet'
+FICHERO_MENSUAL = 'mensual.parquet'
+
+# Función para resumir por día las filas horarias de un periodo
+def resumen_diario(df):
+    dia = df["Fecha"].dt.floor("D").rename("Fecha")
+    partes = []
+    for columna in COLUMNAS:
+        estadisticos = df.groupby(dia)[columna].agg(list(ESTADISTICOS.values()))
+        estadisticos.columns = [f"{columna}_{nombre}" for nombre in ESTADISTICOS]
+        partes.append(estadisticos)
+
+    predicho = df["Predicciones"] if "Predicciones" in df else pd.Series(float("nan"), index=df.index)
+    partes.append(pd.DataFrame({
+        "horas_dia": df["Estado"] == 1,
+        "horas_noche": df["Estado"] == 0,
+        "predichas": predicho.notna(),
+        "aciertos": predicho == df["Estado"],
+    }).groupby(dia).sum())
+
+    return pd.concat(partes, axis=1).reset_index()
+
+# Función para pasar el resumen diario a mensual (columna Mes con el primer día del mes)
+def resumen_mensual(diario):
+    mes = diario["Fecha"].dt.to_period("M").dt.to_timestamp().rename("Mes")
+    grupos = diario.groupby(mes)
+    partes = []
+    for columna in COLUMNAS:
+        horas = grupos[f"{columna}_horas"].sum()
+        partes.append(pd.DataFrame({
+            f"{columna}_media": (diario[f"{columna}_media"] * diario[f"{columna}_horas"]).groupby(mes).sum() / horas,
+            f"{columna}_min": grupos[f"{columna}_min"].min(),
+            f"{columna}_max": grupos[f"{columna}_max"].max(),
+            f"{columna}_horas": horas,
+        }))
+    partes.append(grupos[["horas_dia", "horas_noche", "predichas", "aciertos"]].sum())
+    return pd.concat(partes, axis=1).reset_index()
+
+def _leer(ruta, fichero):
+    destino = os.path.join(ruta, CARPETA, fichero)
+    if not os.path.exists(destino):
+        return None
+    return pd.read_parquet(destino)
+
+def _escribir(df, ruta, fichero):
+    os.makedirs(os.path.join(ruta, CARPETA), exist_ok=True)
+    destino = os.path.join(ruta, CARPETA, fichero)
+    df.to_parquet(destino + '.tmp', index=False)
+    os.replace(destino + '.tmp', destino)
+
+def existen(ruta):
+    return all(os.path.exists(os.path.join(ruta, CARPETA, fichero)) for fichero in (FICHERO_DIARIO, FICHERO_MENSUAL))
+
+def cargar_diario(ruta):
+    return _leer(ruta, FICHERO_DIARIO)
+
+def cargar_mensual(ruta):
+    return _leer(ruta, FICHERO_MENSUAL)
+
+# Función para guardar el resumen diario completo y el mensual que sale de él
+def guardar(diario, ruta):
+    diario = diario.sort_values("Fecha").reset_index(drop=True)
+    _escribir(diario, ruta, FICHERO_DIARIO)
+    _escribir(resumen_mensual(diario), ruta, FICHERO_MENSUAL)
+
+# Función para sustituir en los resúmenes los días del mes que se acaba de escribir.
+# Solo se recalcula ese mes; los demás se conservan tal y como estaban.
+def actualizar_mes(df_mes, año, mes, ruta):
+    nuevo_diario = resumen_diario(df_mes)
+    nuevo_mensual = resumen_mensual(nuevo_diario)
+    mes_inicio = pd.Timestamp(año, mes, 1)
+
+    if existen(ruta):
+        diario = cargar_diario(ruta)
+        mensual = cargar_mensual(ruta)
+        diario = diario[diario["Fecha"].dt.to_period("M") != mes_inicio.to_period("M")]
+        mensual = mensual[mensual["Mes"] != mes_inicio]
+        nuevo_diario = pd.concat([diario, nuevo_diario], ignore_index=True)
+        nuevo_mensual = pd.concat([mensual, nuevo_mensual], ignore_index=True)
+
+    _escribir(nuevo_diario.sort_values("Fecha").reset_index(drop=True), ruta, FICHERO_DIARIO)
+    _escribir(nuevo_mensual.sort_values("Mes").reset_index(drop=True), ruta, FICHERO_MENSUAL)
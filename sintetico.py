@@ -0,0 +1,114 @@
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+# Generador determinista de telemetría de SenseCAP con el mismo formato que devuelve
+# list_telemetry_data: en data.list, la primera lista trae los pares [canal, tipo] con
+# 4102/4103/4108 en un orden que cambia de una respuesta a otra, y las siguientes los
+# bloques de pares [valor, "fecha ISO"] de cada tipo en ese mismo orden.
+#
+# Las lecturas dependen solo de la semilla, el dispositivo, el tipo y la fecha, así que
+# dos ejecuciones (o dos commits distintos) reciben exactamente los mismos datos.
+# Con servir() se levanta una API local para probar la descarga sin tocar la real:
+#
+#     servidor, url = sintetico.servir(sintetico.configuracion(dias=365))
+#     datos.URL_API = url
+
+CONFIGURACION = {
+    "dispositivos": 4,          # número de dispositivos
+    "intervalo": 5,             # minutos entre lecturas
+    "huecos": 0.02,             # probabilidad de que un dispositivo tenga un corte en un día
+    "max_hueco": 12,            # duración máxima de un corte, en horas
+    "fin": None,                # última lectura, en UTC (por defecto, hoy a las 00:00)
+    "parados": {},              # dispositivos que dejan de enviar: posición -> última lectura
+    "dias": 30,                 # días de datos hasta `fin`
+    "semilla": 0,
+}
+
+TIPOS = ["4102", "4103", "4108"]
+# Media, oscilación entre el día y la noche y ruido de cada tipo
+PERFILES = {"4102": (15.0, 6.0, 0.8), "4103": (25.0, -2.0, 0.5), "4108": (0.15, 0.02, 0.01)}
+
+def configuracion(**cambios):
+    config = dict(CONFIGURACION, **cambios)
+    if config["fin"] is None:
+        config["fin"] = datetime.combine(datetime.now(timezone.utc).date(), datetime.min.time())
+    config["inicio"] = config["fin"] - timedelta(days=config["dias"])
+    return config
+
+def dispositivos(config):
+    return [f"2CF7F1C05230{i:04X}" for i in range(config["dispositivos"])]
+
+# Lecturas de un día (número de días desde 1970) de un dispositivo y tipo
+def _lecturas_dia(config, posicion, tipo, dia):
+    minutos = np.arange(0, 24 * 60, config["intervalo"])
+    fechas = np.datetime64(int(dia), 'D') + minutos.astype('timedelta64[m]')
+    media, oscilacion, ruido = PERFILES[tipo]
+    rng = np.random.default_rng([config["semilla"], posicion, TIPOS.index(tipo), int(dia)])
+    estacion = np.sin(2 * np.pi * (dia % 365.25) / 365.25)
+    valores = media * (1 + 0.3 * estacion) + oscilacion * np.sin(2 * np.pi * (minutos / 60 - 9) / 24)
+    valores = np.round(valores + rng.normal(0, ruido, len(minutos)), 2)
+
+    # Los cortes afectan a todos los tipos del dispositivo a la vez
+    rng_cortes = np.random.default_rng([config["semilla"], posicion, len(TIPOS), int(dia)])
+    if rng_cortes.random() < config["huecos"]:
+        comienzo = rng_cortes.integers(0, 24 * 60)
+        duracion = rng_cortes.integers(1, config["max_hueco"] * 60 + 1)
+        conservar = (minutos < comienzo) | (minutos >= comienzo + duracion)
+        fechas, valores = fechas[conservar], valores[conservar]
+    return fechas, valores
+
+# Lecturas de un dispositivo y tipo entre dos instantes (datetime64), ambos incluidos
+def lecturas(config, device_eui, tipo, desde, hasta):
+    posicion = dispositivos(config).index(device_eui)
+    desde = max(np.datetime64(desde, 's'), np.datetime64(config["inicio"], 's'))
+    hasta = min(np.datetime64(hasta, 's'), np.datetime64(config["fin"], 's'))
+    if posicion in config["parados"]:
+        hasta = min(hasta, np.datetime64(config["parados"][posicion], 's'))
+    if desde > hasta:
+        return np.empty(0, dtype='datetime64[m]'), np.empty(0)
+    partes = [_lecturas_dia(config, posicion, tipo, dia)
+              for dia in np.arange(desde.astype('datetime64[D]'), hasta.astype('datetime64[D]') + 1).astype(np.int64)]
+    fechas = np.concatenate([parte[0] for parte in partes])
+    valores = np.concatenate([parte[1] for parte in partes])
+    dentro = (fechas >= desde) & (fechas <= hasta)
+    return fechas[dentro], valores[dentro]
+
+# Respuesta de list_telemetry_data para un dispositivo y un rango en milisegundos
+def respuesta(config, device_eui, inicio_ms, fin_ms):
+    desde = np.datetime64(int(inicio_ms), 'ms')
+    hasta = np.datetime64(int(fin_ms), 'ms')
+    orden = list(TIPOS)
+    np.random.default_rng([config["semilla"], int(inicio_ms) // 1000, int(device_eui, 16) % 2**31]).shuffle(orden)
+
+    bloques = []
+    for tipo in orden:
+        fechas, valores = lecturas(config, device_eui, tipo, desde, hasta)
+        textos = np.char.add(np.datetime_as_string(fechas, unit='s'), '.000Z')
+        # La API devuelve las lecturas de la más reciente a la más antigua
+        bloques.append([[float(v), t] for v, t in zip(valores[::-1], textos[::-1])])
+    return {"code": "0", "data": {"list": [[[1, tipo] for tipo in orden], bloques]}}
+
+# API local que sirve las respuestas generadas. Devuelve el servidor y la URL.
+def servir(config, puerto=0):
+    class Manejador(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            parametros = parse_qs(urlparse(self.path).query)
+            cuerpo = json.dumps(respuesta(config, parametros['device_eui'][0], parametros['time_start'][0],
+                                          parametros['time_end'][0])).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+    servidor = ThreadingHTTPServer(('127.0.0.1', puerto), Manejador)
+    threading.Thread(target=servidor.serve_forever, daemon=True, name="api-sintetica").start()
+    return servidor, f"http://127.0.0.1:{servidor.server_address[1]}/openapi/list_telemetry_data"
@@ -0,0 +1,21 @@
+import matplotlib
+import numpy as np
+import pandas as pd
+
+matplotlib.use("Agg")
+
+import graficas
+
+# Horas guardadas por la sincronización que aún no ha puntuado el modelo: su predicción es
+# NaN y se quedan sin sombrear, sin romper la gráfica del día
+def test_grafica_dia_con_horas_sin_predecir():
+    fechas = pd.date_range("2024-04-10", periods=24, freq="h")
+    clases = np.r_[[0] * 6, [1] * 12, [0] * 6].astype(float)
+    clases[[10, 11, 22, 23]] = np.nan
+
+    tramos = graficas.tramos_por_clase(fechas, clases)
+    assert sorted(tramos) == [0, 1]
+    assert len(tramos[1]) == 2 and len(tramos[0]) == 2
+
+    df = pd.DataFrame({"Fecha": fechas, "Predicciones": clases, **dict.fromkeys(graficas.COLUMNAS, 1.0)})
+    graficas.grafica_dia(df, "10/04/2024")
@@ -0,0 +1,27 @@
+import multiprocessing
+
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+import registro_modelos
+
+# Registro de modelos desde varios procesos a la vez (la ingesta en segundo plano y
+# modelo.py, por ejemplo): cada registro debe quedarse con su propia versión.
+
+PROCESOS = 8
+REGISTROS = 24
+
+def registrar(argumentos):
+    ruta, i = argumentos
+    modelo = Pipeline([("imputer", StandardScaler()), ("scaler", StandardScaler()), ("classifier", StandardScaler())])
+    return registro_modelos.registrar(modelo, {"i": i}, ruta=ruta)
+
+def test_registros_simultaneos(tmp_path):
+    ruta = str(tmp_path / "modelos")
+    with multiprocessing.get_context("fork").Pool(PROCESOS) as procesos:
+        versiones = procesos.map(registrar, [(ruta, i) for i in range(REGISTROS)])
+
+    assert len(set(versiones)) == REGISTROS
+    assert registro_modelos.versiones(ruta) == sorted(versiones)
+    assert registro_modelos.version_actual(ruta) in versiones
+    assert sorted(registro_modelos.metadatos(version, ruta)["i"] for version in versiones) == list(range(REGISTROS))
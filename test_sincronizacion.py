@@ -0,0 +1,104 @@
+import threading
+import time
+from datetime import timedelta
+
+import pandas as pd
+import pytest
+
+import almacen
+import cache_respuestas
+import datos
+import refresco
+import sintetico
+from descarga import ahora_utc
+
+# Sincronización incremental contra la API sintética (sintetico.py): varias
+# sincronizaciones seguidas, a medida que llegan lecturas, deben dejar el mismo almacén
+# que una sola sincronización completa al final.
+
+PASOS = [timedelta(minutes=13), timedelta(hours=3, minutes=40), timedelta(days=1, hours=7), timedelta(days=2, hours=3)]
+
+@pytest.fixture
+def api(monkeypatch, tmp_path):
+    # La primera lectura nueva cae a mitad de hora, para que la última hora guardada quede a medias
+    fin = pd.Timestamp(ahora_utc()).floor('h').to_pydatetime() - timedelta(days=4) + timedelta(minutes=23)
+    config = sintetico.configuracion(fin=fin, dias=3, huecos=0.1, parados={})
+    servidor, url = sintetico.servir(config)
+    monkeypatch.setattr(datos, "URL_API", url)
+    monkeypatch.setattr(datos, "DISPOSITIVOS", sintetico.dispositivos(config))
+    monkeypatch.setattr(datos, "FECHA_INICIO", config["inicio"])
+    monkeypatch.setattr(datos, "RUTA_DATOS", str(tmp_path / "datos_huerto.pkl"))
+    # Las ventanas de la API sintética cambian aunque por fecha estén cerradas
+    monkeypatch.setattr(cache_respuestas, "MODO", "desactivada")
+    yield config
+    servidor.shutdown()
+
+@pytest.fixture
+def zona_horaria(monkeypatch):
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+def sincronizar(config, fin, ruta):
+    config["fin"] = fin
+    return datos.sincronizar(str(ruta), str(ruta) + ".json")
+
+def sincronizar_por_pasos(config, ruta):
+    fin = config["fin"]
+    sincronizar(config, fin, ruta)
+    for paso in PASOS:
+        fin += paso
+        sincronizar(config, fin, ruta)
+    return fin
+
+def comprobar_iguales(incremental, completo):
+    pd.testing.assert_frame_equal(almacen.cargar(ruta=str(incremental)), almacen.cargar(ruta=str(completo)),
+                                  check_exact=False, rtol=1e-12)
+    pd.testing.assert_frame_equal(almacen.cargar_dispositivos(ruta=str(incremental)),
+                                  almacen.cargar_dispositivos(ruta=str(completo)), check_exact=False, rtol=1e-12)
+
+def test_incremental_igual_que_completa(api, tmp_path):
+    fin = sincronizar_por_pasos(api, tmp_path / "incremental")
+    sincronizar(api, fin, tmp_path / "completo")
+    comprobar_iguales(tmp_path / "incremental", tmp_path / "completo")
+
+# Las marcas y los inicios son UTC: en un equipo al oeste de UTC no se pierden las horas
+# entre la marca y su hora local
+def test_incremental_igual_que_completa_fuera_de_utc(api, zona_horaria, tmp_path):
+    fin = sincronizar_por_pasos(api, tmp_path / "incremental")
+    sincronizar(api, fin, tmp_path / "completo")
+    comprobar_iguales(tmp_path / "incremental", tmp_path / "completo")
+
+# Un dispositivo que deja de enviar no hace crecer el acumulado ni la descarga: su inicio
+# sigue al resto con MARGEN_RETRASO de retraso
+def test_dispositivo_parado(api, tmp_path):
+    api["parados"][1] = api["fin"] + timedelta(hours=1)
+    ruta = tmp_path / "incremental"
+    fin = sincronizar_por_pasos(api, ruta)
+
+    marcas = datos.cargar_marcas(str(ruta) + ".json")
+    parado = datos.DISPOSITIVOS[1]
+    inicio = datos.inicios_por_dispositivo(marcas, datos.FECHA_INICIO)[parado]
+    assert inicio >= fin - datos.MARGEN_RETRASO - timedelta(hours=1)
+    horas = almacen.cargar_acumulado(str(ruta))["horas"]
+    assert len(horas) <= datos.MARGEN_RETRASO / timedelta(hours=1) + 1
+
+    sincronizar(api, fin, tmp_path / "completo")
+    comprobar_iguales(ruta, tmp_path / "completo")
+
+# La reconstrucción de los dispositivos espera a que termine la sincronización en curso
+# y deja las mismas medias que ella
+def test_reconstruir_dispositivos_espera_a_la_sincronizacion(api, tmp_path):
+    ruta = str(tmp_path / "almacen")
+    sincronizar(api, api["fin"], tmp_path / "almacen")
+    esperado = almacen.cargar_dispositivos(ruta=ruta)
+
+    with refresco.cerrojo(ruta):
+        hilo = threading.Thread(target=datos.reconstruir_dispositivos, args=(ruta,))
+        hilo.start()
+        hilo.join(1)
+        assert hilo.is_alive()
+    hilo.join()
+    pd.testing.assert_frame_equal(almacen.cargar_dispositivos(ruta=ruta), esperado, check_exact=False, rtol=1e-12)